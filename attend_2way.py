@@ -1,14 +1,28 @@
+import argparse
 import requests
 from bs4 import BeautifulSoup
-from urllib.parse import urljoin
+from urllib.parse import parse_qs, urljoin, urlsplit
 import time
-import openpyxl
+from contextlib import nullcontext
 from openpyxl.styles import Alignment, Font
-import io
-from attendance_downloader import get_attendance_data, download_photo
-from openpyxl.drawing.image import Image as XLImage
+from attendance_downloader import excel_image, fetch_attendance_page, new_workbook, store_photo, styled_cell
+from crawl_journal import CrawlJournal
+from nav_cache import NavCache
+from image_processing import IMAGE_MAX_SIZE, JPEG_QUALITY, ImageProcessor, OriginalsArchive
+from excel_media import save_workbook
+from image_store import ImageStore
+from attendance_analytics import pandas_available, require_pandas, save_summary_excel
+from attendance_store import DB_PATH, AttendanceStore, ingest_rows
+from muster_index import is_past_date
+from muster_parser import PageParser
+from table_export import ATTENDANCE_HEADER, TABLE_FORMATS, CsvTableWriter, attendance_row, write_table
+from http_client import HEADERS, get_session, http_get, http_post
+from instrumentation import PROFILERS, Instrumentation, report_file_base
+import progress
 import re
+import threading
 from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
 
 # Constants
 BASE_URL = "https://mnregaweb4.nic.in/nregaarch/View_NMMS_atten_date_new.aspx?fin_year=2024-2025&Digest=HNrisV4bhHnb7Gve3mAKYQ"
@@ -17,10 +31,8 @@ DISTRICT_NAME = 'BALLARI'
 BLOCK_NAME = 'SIRUGUPPA'
 TALUK_NAME = 'Siruguppa'
 DISTRICT_LABEL = 'Ballari'
-
-HEADERS = {
-    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
-}
+MAX_WORKERS = 8
+DEFAULT_PARALLEL_PANCHAYATHS = 3
 
 def get_table_by_id_or_div(soup, table_id='grdTable', div_id='RepPr1'):
     table = soup.find('table', {'id': table_id})
@@ -39,7 +51,8 @@ def get_link_from_table(table, match_col_idx, match_text, href_col_idx=None):
                 return a['href']
     return None
 
-def get_panchayath_link(table, panchayath_name):
+def get_panchayath_links(table):
+    links = {}
     for row in table.find_all('tr'):
         cols = row.find_all('td')
         if len(cols) >= 4:
@@ -49,9 +62,12 @@ def get_panchayath_link(table, panchayath_name):
             panch_name = cols[1].get_text(strip=True).upper()
             muster_rolls_a = cols[3].find('a', href=True)
             href = muster_rolls_a['href'] if muster_rolls_a else None
-            if panch_name == panchayath_name and href:
-                return href
-    return None
+            if href:
+                links.setdefault(panch_name, href)
+    return links
+
+def get_panchayath_link(table, panchayath_name):
+    return get_panchayath_links(table).get(panchayath_name)
 
 def get_muster_roll_rows(muster_table, choice, workcode=None, workcode_idx=None, muster_no_idx=None):
     rows_to_save = []
@@ -82,43 +98,48 @@ def prompt_user_for_inputs(date_options):
     return attendance_date, panchayath_name, choice, workcode
 
 def save_attendance_excel(wb, ws, img_wb, img_ws, panchayath_name, attendance_date):
-    wb.save(f"muster_rolls_{panchayath_name}_{attendance_date.replace('/', '_')}.xlsx")
-    img_wb.save(f"muster_roll_images_{panchayath_name}_{attendance_date.replace('/', '_')}.xlsx")
+    with progress.phase('save'):
+        save_workbook(wb, f"muster_rolls_{panchayath_name}_{attendance_date.replace('/', '_')}.xlsx")
+        save_workbook(img_wb, f"muster_roll_images_{panchayath_name}_{attendance_date.replace('/', '_')}.xlsx")
     print(f"Saved muster_rolls_{panchayath_name}_{attendance_date.replace('/', '_')}.xlsx")
     print(f"Saved muster_roll_images_{panchayath_name}_{attendance_date.replace('/', '_')}.xlsx")
 
-def save_raw_excel(rows_to_save, panchayath_name, attendance_date, muster_no_idx, workcode_idx, panchayath_url, muster_data_cache):
-    raw_wb = openpyxl.Workbook()
-    raw_ws = raw_wb.active
-    raw_ws.append([
-        "Taluk", "Panchayath", "Work Code", "Muster Roll No", "Job Card No", "Worker Name", "Gender", "Attendance", "Attendance Date"
-    ])
+RAW_HEADER = ATTENDANCE_HEADER
+
+def raw_attendance_rows(rows_to_save, panchayath_name, muster_no_idx, workcode_idx, panchayath_url, muster_data_cache):
     for cols, muster_href in rows_to_save:
         muster_url = urljoin(panchayath_url, muster_href)
-        attendance_data, _, _, _ = muster_data_cache.get(muster_url, (None, None, None, None))
+        attendance_data = muster_data_cache.get(muster_url)
         muster_roll_no = cols[muster_no_idx].get_text(strip=True)
         work_code = cols[workcode_idx].get_text(strip=True)
         for att_row in attendance_data or []:
-            worker_name_full = att_row[2] if len(att_row) > 2 else ''
-            if worker_name_full.endswith(')') and '(' in worker_name_full:
-                name_part = worker_name_full[:worker_name_full.rfind('(')].strip()
-                gender_part = worker_name_full[worker_name_full.rfind('(')+1:-1].strip()
-            else:
-                name_part = worker_name_full
-                gender_part = ''
-            raw_ws.append([
-                TALUK_NAME,
-                panchayath_name,
-                work_code,
-                muster_roll_no,
-                att_row[1] if len(att_row) > 1 else '',
-                name_part,
-                gender_part,
-                att_row[4] if len(att_row) > 4 else '',
-                att_row[3] if len(att_row) > 3 else '',
-            ])
-    raw_wb.save(f"muster_rolls_raw_{panchayath_name}_{attendance_date.replace('/', '_')}.xlsx")
-    print(f"Saved muster_rolls_raw_{panchayath_name}_{attendance_date.replace('/', '_')}.xlsx")
+            yield attendance_row(TALUK_NAME, panchayath_name, work_code, muster_roll_no, att_row)
+
+def write_raw_excel(raw_rows, file_name, write_only=False):
+    with progress.phase('excel'):
+        raw_wb, raw_ws = new_workbook(None, write_only)
+        raw_ws.append(RAW_HEADER)
+        for raw_row in raw_rows:
+            raw_ws.append(raw_row)
+    with progress.phase('save'):
+        raw_wb.save(file_name)
+    print(f"Saved {file_name}")
+
+def write_raw_table(raw_rows, file_base, table_format):
+    file_name = f"{file_base}.{table_format}"
+    with progress.phase('save'):
+        write_table(raw_rows, file_name, table_format)
+    print(f"Saved {file_name}")
+
+def save_raw_excel(rows_to_save, panchayath_name, attendance_date, muster_no_idx, workcode_idx, panchayath_url, muster_data_cache, write_only=False, table_format=None, summary=False):
+    raw_rows = list(raw_attendance_rows(rows_to_save, panchayath_name, muster_no_idx, workcode_idx, panchayath_url, muster_data_cache))
+    file_base = f"muster_rolls_raw_{panchayath_name}_{attendance_date.replace('/', '_')}"
+    write_raw_excel(raw_rows, f"{file_base}.xlsx", write_only)
+    if table_format:
+        write_raw_table(raw_rows, file_base, table_format)
+    if summary:
+        save_summary_excel(raw_rows, f"muster_rolls_summary_{panchayath_name}_{attendance_date.replace('/', '_')}.xlsx", write_only)
+    return raw_rows
 
 def find_col_idx(header_cols, search):
     search_clean = re.sub(r'[^a-zA-Z0-9]', '', search.lower())
@@ -128,22 +149,46 @@ def find_col_idx(header_cols, search):
             return i
     return None
 
-def fetch_muster_data(muster_url):
-    return get_attendance_data(muster_url)
+class RowWriter:
+    # Writes rows at absolute positions using append only, padding the gaps with
+    # blank rows, so the same layout code works for write-only worksheets
+    def __init__(self, ws, write_only=False):
+        self.ws = ws
+        self.write_only = write_only
+        self.rows_written = 0
 
-def main():
-    session = requests.Session()
-    resp = session.get(BASE_URL, headers=HEADERS)
-    soup = BeautifulSoup(resp.content, 'html.parser')
+    def write(self, row_idx, values):
+        while self.rows_written < row_idx - 1:
+            self.ws.append([])
+            self.rows_written += 1
+        self.ws.append(values)
+        self.rows_written += 1
+
+    def merge_first_column(self, start_row, end_row):
+        # openpyxl has no public merge for write-only worksheets; there the cell
+        # just stays in the top row of its block
+        if not self.write_only:
+            self.ws.merge_cells(start_row=start_row, start_column=1, end_row=end_row, end_column=1)
+
+def fetch_muster_data(muster_url, journal=None, page_parser=None):
+    if journal is not None:
+        journaled = journal.get_muster(muster_url)
+        if journaled is not None:
+            return journaled
+    try:
+        result = fetch_attendance_page(muster_url, page_parser=page_parser)
+    except requests.exceptions.RequestException as e:
+        print(f"Error fetching attendance data: {e}")
+        progress.record_fetch_error(muster_url)
+        return None, None, None, None
+    if journal is not None:
+        journal.record_muster(muster_url, result)
+    return result
 
+def submit_attendance_form(session, soup, attendance_date):
     viewstate = soup.find('input', {'id': '__VIEWSTATE'})['value']
     eventvalidation = soup.find('input', {'id': '__EVENTVALIDATION'})['value']
     viewstategen = soup.find('input', {'id': '__VIEWSTATEGENERATOR'})['value']
-
-    attendance_select = soup.find('select', {'name': 'ctl00$ContentPlaceHolder1$ddl_attendance'})
-    date_options = [opt['value'] for opt in attendance_select.find_all('option')]
-    attendance_date, panchayath_name, choice, workcode = prompt_user_for_inputs(date_options)
-
     data = {
         '__VIEWSTATE': viewstate,
         '__VIEWSTATEGENERATOR': viewstategen,
@@ -154,75 +199,99 @@ def main():
     }
     headers_post = HEADERS.copy()
     headers_post['Referer'] = BASE_URL
-    resp2 = session.post(BASE_URL, data=data, headers=headers_post)
-    # time.sleep(3)
+    resp2 = http_post(BASE_URL, session=session, data=data, headers=headers_post)
     soup2 = BeautifulSoup(resp2.content, 'html.parser')
 
     # State table navigation
     state_table = get_table_by_id_or_div(soup2)
     if not state_table:
         print("Could not find state table.")
-        return
+        return None
     karnataka_link = get_link_from_table(state_table, 1, 'KARNATAKA')
     if not karnataka_link:
         print("Could not find Karnataka link in state table.")
-        return
-    karnataka_url = urljoin(BASE_URL, karnataka_link)
-
-    # Districts table navigation
-    resp3 = session.get(karnataka_url, headers=HEADERS)
-    soup3 = BeautifulSoup(resp3.content, 'html.parser')
-    dist_table = get_table_by_id_or_div(soup3)
-    if not dist_table:
-        print("Could not find districts table.")
-        return
-    ballari_link = get_link_from_table(dist_table, 1, DISTRICT_NAME)
-    if not ballari_link:
-        print("Could not find Ballari link in districts table.")
-        return
-    ballari_url = urljoin(karnataka_url, ballari_link)
-
-    # Block/Taluk table navigation
-    resp4 = session.get(ballari_url, headers=HEADERS)
-    soup4 = BeautifulSoup(resp4.content, 'html.parser')
-    block_table = get_table_by_id_or_div(soup4)
-    if not block_table:
-        print("Could not find block/taluk table.")
-        return
-    siruguppa_link = get_link_from_table(block_table, 1, BLOCK_NAME)
-    if not siruguppa_link:
-        print("Could not find Siruguppa link in block/taluk table.")
-        return
-    siruguppa_url = urljoin(ballari_url, siruguppa_link)
+        return None
+    return urljoin(BASE_URL, karnataka_link)
+
+def follow_table_link(session, url, match_text, label):
+    resp = http_get(url, session=session, headers=HEADERS)
+    soup = BeautifulSoup(resp.content, 'html.parser')
+    table = get_table_by_id_or_div(soup)
+    if not table:
+        print(f"Could not find {label} table.")
+        return None
+    link = get_link_from_table(table, 1, match_text)
+    if not link:
+        print(f"Could not find {match_text.title()} link in {label} table.")
+        return None
+    return urljoin(url, link)
 
-    # Panchayath table navigation
-    resp5 = session.get(siruguppa_url, headers=HEADERS)
-    soup5 = BeautifulSoup(resp5.content, 'html.parser')
-    panch_div = soup5.find('div', {'id': 'RepPr1'})
+def fetch_panchayath_links(session, block_url):
+    resp = http_get(block_url, session=session, headers=HEADERS)
+    soup = BeautifulSoup(resp.content, 'html.parser')
+    panch_div = soup.find('div', {'id': 'RepPr1'})
     if not panch_div:
         print("Could not find panchayath table container.")
-        return
+        return None
     panch_table = panch_div.find('table')
     if not panch_table:
         print("Could not find panchayath table.")
-        return
-    panchayath_link = get_panchayath_link(panch_table, panchayath_name)
-    if not panchayath_link:
+        return None
+    return {name: urljoin(block_url, href) for name, href in get_panchayath_links(panch_table).items()}
+
+def get_panchayath_url(session, block_url, panchayath_name):
+    links = fetch_panchayath_links(session, block_url)
+    if links is None:
+        return None
+    panchayath_url = links.get(panchayath_name)
+    if not panchayath_url:
         print("No NMR generated by the Panchayath")
-        return
-    panchayath_url = urljoin(siruguppa_url, panchayath_link)
+        return None
+    return panchayath_url
+
+def navigate_to_panchayath(session, form, attendance_date, panchayath_name, journal):
+    # Each resolved link is journaled; steps already in the journal are skipped.
+    # Without a panchayath name this stops at the block's panchayath list.
+    steps = [
+        ('state', lambda url: submit_attendance_form(session, form.soup, attendance_date)),
+        ('district', lambda url: follow_table_link(session, url, DISTRICT_NAME, 'districts')),
+        ('block', lambda url: follow_table_link(session, url, BLOCK_NAME, 'block/taluk')),
+    ]
+    if panchayath_name:
+        steps.append(('panchayath', lambda url: get_panchayath_url(session, url, panchayath_name)))
+    url = None
+    for step, resolve in steps:
+        if step in journal.nav:
+            url = journal.nav[step]
+            continue
+        url = resolve(url)
+        if not url:
+            return None
+        journal.record_nav(step, url)
+    return url
 
-    # Muster Roll table navigation
-    resp6 = session.get(panchayath_url, headers=HEADERS)
+def get_muster_table(session, panchayath_url):
+    resp6 = http_get(panchayath_url, session=session, headers=HEADERS)
     soup6 = BeautifulSoup(resp6.content, 'html.parser')
     muster_div = soup6.find('div', {'id': 'RepPr1'})
     if not muster_div:
         print("Could not find muster roll table container.")
-        return
+        return None
     muster_table = muster_div.find('table')
     if not muster_table:
         print("Could not find muster roll table.")
-        return
+        return None
+    return muster_table
+
+def get_saved_muster_table(session, panchayath_url):
+    # A journaled or cached link may have gone stale; None lets the caller navigate again
+    try:
+        return get_muster_table(session, panchayath_url)
+    except requests.exceptions.RequestException as e:
+        print(f"Saved Panchayath link failed: {e}")
+        return None
+
+def find_muster_table_columns(muster_table):
     header_row = muster_table.find('tr')
     header_cols = [th.get_text(strip=True).replace('\u00a0', ' ').strip().lower() for th in header_row.find_all(['th', 'td'])]
     workcode_idx = find_col_idx(header_cols, 'work code')
@@ -230,6 +299,206 @@ def main():
     if workcode_idx is None or muster_no_idx is None:
         print("Could not find required columns in muster roll table header.")
         print("Header columns found:", header_cols)
+    return workcode_idx, muster_no_idx
+
+class AttendanceForm:
+    # The attendance date form page. It is only requested when the date dropdown is
+    # not in the navigation cache or a drill-down walk has to POST it.
+    def __init__(self, session, nav_cache, fresh=False):
+        self.session = session
+        self.nav_cache = nav_cache
+        self.fresh = fresh
+        self.lock = threading.Lock()
+        self._soup = None
+
+    @property
+    def soup(self):
+        with self.lock:
+            if self._soup is None:
+                with progress.phase('navigation'):
+                    resp = http_get(BASE_URL, session=self.session, headers=HEADERS)
+                self._soup = BeautifulSoup(resp.content, 'html.parser')
+            return self._soup
+
+    def date_options(self, wanted=None):
+        # A cached dropdown is reloaded when it lacks one of the wanted dates
+        options = None if self.fresh else self.nav_cache.date_options()
+        if options is not None and wanted and wanted != ['all'] and not set(wanted) <= set(options):
+            options = None
+        if options is None:
+            attendance_select = self.soup.find('select', {'name': 'ctl00$ContentPlaceHolder1$ddl_attendance'})
+            options = [opt['value'] for opt in attendance_select.find_all('option')]
+            self.nav_cache.record_date_options(options)
+        return options
+
+def fin_year_of(url):
+    return parse_qs(urlsplit(url).query).get('fin_year', [''])[0]
+
+def select_dates(date_options, dates):
+    if not dates or dates == ['all']:
+        return date_options
+    unknown = [d for d in dates if d not in date_options]
+    if unknown:
+        print("Skipping dates not offered by the portal:", unknown)
+    return [d for d in dates if d in date_options]
+
+def get_block_panchayath_links(session, form, attendance_date, fresh=False):
+    # Shared navigation: one POST and one state/district/block walk per date, none
+    # while the navigation cache holds the date. Returns the resolved nav steps and
+    # the block's panchayath links.
+    cached = None if fresh else form.nav_cache.get(attendance_date)
+    if cached is not None:
+        return cached
+    block_journal = CrawlJournal(attendance_date, BLOCK_NAME, fresh=fresh)
+    try:
+        with progress.phase('navigation'):
+            block_url = navigate_to_panchayath(session, form, attendance_date, None, block_journal)
+            panch_links = fetch_panchayath_links(session, block_url) if block_url else None
+            if panch_links is None and block_url:
+                # A stale journaled link; walk down from the top once more
+                block_journal.forget_nav()
+                block_url = navigate_to_panchayath(session, form, attendance_date, None, block_journal)
+                panch_links = fetch_panchayath_links(session, block_url) if block_url else None
+        if not panch_links:
+            print(f"No panchayaths found for {attendance_date}")
+        else:
+            form.nav_cache.record(attendance_date, block_journal.nav, panch_links)
+            # The walk finished and the navigation cache holds it now; the journal only
+            # resumes an interrupted walk, so it must not outlive the cache's TTL
+            block_journal.mark_complete()
+    finally:
+        block_journal.close()
+    return dict(block_journal.nav), panch_links
+
+def seed_journal(journal, block_nav, panchayath_url):
+    # Starts a panchayath journal from links resolved for the whole block
+    for step in ('state', 'district', 'block'):
+        if step not in journal.nav and step in block_nav:
+            journal.record_nav(step, block_nav[step])
+    if 'panchayath' not in journal.nav:
+        journal.record_nav('panchayath', panchayath_url)
+
+def select_panchayaths(panch_links, panchayaths, attendance_date):
+    if not panchayaths or panchayaths == ['ALL']:
+        return list(panch_links)
+    for name in panchayaths:
+        if name not in panch_links:
+            print(f"No NMR generated by the Panchayath {name} on {attendance_date}")
+    return [name for name in panchayaths if name in panch_links]
+
+def main(write_only=False, image_max_size=IMAGE_MAX_SIZE, image_quality=JPEG_QUALITY, keep_originals=False, fresh=False,
+         panchayaths=None, dates=None, choice='all', workcode=None, parallel=DEFAULT_PARALLEL_PANCHAYATHS,
+         workers=MAX_WORKERS, table_format=None, store_path=None, sync=False, instrument=False, profile=None,
+         parse_workers=0, summary=False, max_per_host=None):
+    # instrument (or a profile) times every stage and writes a JSON timing report next
+    # to the workbooks; otherwise no tracker is bound and the stage hooks do nothing
+    instrumentation = None
+    if instrument or profile:
+        instrumentation = Instrumentation('attend_2way', report_file_base(), profiler=profile, run=dict(
+            panchayaths=panchayaths, dates=dates, choice=choice, workcode=workcode, parallel=parallel, workers=workers,
+            sync=sync, write_only=write_only, image_max_size=image_max_size, table_format=table_format,
+            parse_workers=parse_workers, summary=summary, max_per_host=max_per_host))
+    if summary:
+        # Fail before downloading, not after
+        require_pandas()
+    # One parse pool shared by every panchayath, so the download threads only do I/O
+    page_parser = PageParser(parse_workers) if parse_workers else None
+    try:
+        with instrumentation.active() if instrumentation else nullcontext():
+            download(write_only, image_max_size, image_quality, keep_originals, fresh, panchayaths, dates, choice,
+                     workcode, parallel, workers, table_format, store_path, sync, page_parser, summary, max_per_host)
+    finally:
+        if page_parser is not None:
+            page_parser.close()
+        if instrumentation:
+            instrumentation.write_report()
+
+def download(write_only, image_max_size, image_quality, keep_originals, fresh, panchayaths, dates, choice, workcode,
+             parallel, workers, table_format, store_path, sync, page_parser=None, summary=False, max_per_host=None):
+    session = get_session(pool_size=workers * (parallel if panchayaths or sync else 1), max_per_host=max_per_host)
+    form = AttendanceForm(session, NavCache(fin_year_of(BASE_URL), BLOCK_NAME), fresh)
+    options = dict(write_only=write_only, image_max_size=image_max_size, image_quality=image_quality,
+                   keep_originals=keep_originals, workers=workers, table_format=table_format,
+                   store_path=store_path, page_parser=page_parser, summary=summary)
+    if sync:
+        run_sync(session, form, panchayaths, dates, parallel, workers, store_path or DB_PATH, table_format, fresh, page_parser)
+        return
+    if panchayaths:
+        run_batch(session, form, panchayaths, dates, choice, workcode, parallel, fresh, options)
+        return
+    attendance_date, panchayath_name, choice, workcode = prompt_user_for_inputs(form.date_options())
+
+    journal = CrawlJournal(attendance_date, panchayath_name, fresh=fresh)
+    try:
+        if 'panchayath' not in journal.nav:
+            block_nav, panch_links = get_block_panchayath_links(session, form, attendance_date, fresh)
+            if not panch_links:
+                return
+            if panchayath_name not in panch_links:
+                print("No NMR generated by the Panchayath")
+                return
+            seed_journal(journal, block_nav, panch_links[panchayath_name])
+        run_panchayath(session, form, attendance_date, panchayath_name, choice, workcode, journal, **options)
+    finally:
+        journal.close()
+
+def run_batch(session, form, panchayaths, dates, choice, workcode, parallel, fresh, options):
+    dates = select_dates(form.date_options(dates), dates)
+    all_raw_rows = []
+    for attendance_date in dates:
+        block_nav, panch_links = get_block_panchayath_links(session, form, attendance_date, fresh)
+        if not panch_links:
+            continue
+        selected = select_panchayaths(panch_links, panchayaths, attendance_date)
+
+        def process(panchayath_name):
+            journal = CrawlJournal(attendance_date, panchayath_name, fresh=fresh)
+            try:
+                seed_journal(journal, block_nav, panch_links[panchayath_name])
+                return run_panchayath(session, form, attendance_date, panchayath_name, choice, workcode, journal, **options) or []
+            except Exception as e:
+                print(f"Error processing {panchayath_name} on {attendance_date}: {e}")
+                return []
+            finally:
+                journal.close()
+
+        with ThreadPoolExecutor(max_workers=max(1, parallel)) as executor:
+            for raw_rows in executor.map(progress.bind(progress.current(), process), selected):
+                all_raw_rows.extend(raw_rows)
+    if not dates:
+        return
+    date_part = dates[0] if len(dates) == 1 else f"{dates[0]}_to_{dates[-1]}"
+    file_base = f"muster_rolls_raw_batch_{date_part.replace('/', '_')}"
+    write_raw_excel(all_raw_rows, f"{file_base}.xlsx", options['write_only'])
+    if options['table_format']:
+        write_raw_table(all_raw_rows, file_base, options['table_format'])
+    if options['summary']:
+        # Across every date and panchayath of the batch, so absentee streaks span the dates
+        save_summary_excel(all_raw_rows, f"muster_rolls_summary_batch_{date_part.replace('/', '_')}.xlsx", options['write_only'])
+
+def run_panchayath(session, form, attendance_date, panchayath_name, choice, workcode, journal,
+                   write_only=False, image_max_size=IMAGE_MAX_SIZE, image_quality=JPEG_QUALITY, keep_originals=False,
+                   workers=MAX_WORKERS, table_format=None, store_path=None, page_parser=None, summary=False):
+    muster_table = None
+    panchayath_url = journal.nav.get('panchayath')
+    if panchayath_url:
+        if journal.resumed_musters:
+            print(f"Resuming from checkpoint {journal.path}")
+        with progress.phase('navigation'):
+            muster_table = get_saved_muster_table(session, panchayath_url)
+        if muster_table is None:
+            # Stale checkpoint or cached link
+            journal.forget_nav()
+            form.nav_cache.forget(attendance_date)
+    if muster_table is None:
+        with progress.phase('navigation'):
+            panchayath_url = navigate_to_panchayath(session, form, attendance_date, panchayath_name, journal)
+            # Muster Roll table navigation
+            muster_table = get_muster_table(session, panchayath_url) if panchayath_url else None
+        if muster_table is None:
+            return
+    workcode_idx, muster_no_idx = find_muster_table_columns(muster_table)
+    if workcode_idx is None or muster_no_idx is None:
         return
 
     rows_to_save = get_muster_roll_rows(muster_table, choice, workcode, workcode_idx, muster_no_idx)
@@ -237,114 +506,286 @@ def main():
         print("No muster roll data found for the selection.")
         return
 
-    # Excel setup
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    row_cursor = 1
-    ws.cell(row=row_cursor, column=1, value="District:").font = Font(bold=True)
-    ws.cell(row=row_cursor, column=2, value=DISTRICT_LABEL)
-    ws.cell(row=row_cursor, column=3, value="Taluk/Block:").font = Font(bold=True)
-    ws.cell(row=row_cursor, column=4, value=TALUK_NAME)
-    row_cursor += 1
-    ws.cell(row=row_cursor, column=1, value="Panchayath:").font = Font(bold=True)
-    ws.cell(row=row_cursor, column=2, value=panchayath_name)
-    row_cursor += 1
-    workcode_row_idx_att = row_cursor
-    ws.cell(row=workcode_row_idx_att, column=1, value="Work code:").font = Font(bold=True)
-    ws.cell(row=workcode_row_idx_att, column=3, value="Work Name:").font = Font(bold=True)
-    row_cursor += 1
-    attendance_header_written = False
-    first_muster_processed = False
-    first_work_code = ''
-    first_work_name = ''
-
-    # Image-only Excel setup
-    img_wb = openpyxl.Workbook()
-    img_ws = img_wb.active
-    img_row_cursor = 1
-    img_bytes_refs = []
-    img_ws.cell(row=img_row_cursor, column=1, value="District:").font = Font(bold=True)
-    img_ws.cell(row=img_row_cursor, column=2, value=DISTRICT_LABEL)
-    img_ws.cell(row=img_row_cursor, column=3, value="Taluk/Block:").font = Font(bold=True)
-    img_ws.cell(row=img_row_cursor, column=4, value=TALUK_NAME)
-    img_row_cursor += 1
-    img_ws.cell(row=img_row_cursor, column=1, value="Panchayath:").font = Font(bold=True)
-    img_ws.cell(row=img_row_cursor, column=2, value=panchayath_name)
-    img_row_cursor += 1
-    workcode_row_idx = img_row_cursor
-    img_ws.cell(row=workcode_row_idx, column=1, value="Work code:").font = Font(bold=True)
-    img_ws.cell(row=workcode_row_idx, column=3, value="Work Name:").font = Font(bold=True)
-    img_row_cursor += 1
-    header_row_idx = img_row_cursor
-    img_ws.cell(row=header_row_idx, column=1, value='Muster Roll No').font = Font(bold=True)
-    img_ws.cell(row=header_row_idx, column=2, value='Image').font = Font(bold=True)
-    img_row_cursor += 1
+    # Each photo is held once and shared by both workbooks
+    image_store = ImageStore()
+    image_processor = ImageProcessor(image_max_size, image_quality) if image_max_size else None
+    originals = OriginalsArchive() if keep_originals else None
+
+    def fetch_muster_roll(i):
+        # Page and photo are fetched in the same worker, so photo downloads overlap
+        # with other pages instead of running one by one after them
+        attendance_data, photo_url, work_name, header_cells = fetch_muster_data(muster_urls[i], journal, page_parser)
+        img_bytes = None
+        if photo_url:
+            img_bytes = store_photo(photo_url, image_store, image_processor, originals, f"muster_{muster_roll_nos[i]}.jpg")
+        return (attendance_data, photo_url, work_name, header_cells), img_bytes
 
     # Main loop: cache attendance data for each muster roll
     muster_data_cache = {}
-    with ThreadPoolExecutor(max_workers=8) as executor:
-        muster_urls = [urljoin(panchayath_url, href) for _, href in rows_to_save]
-        results = list(executor.map(fetch_muster_data, muster_urls))
-    # Now results[i] corresponds to muster_urls[i]
-
-    for i, (muster_url, (attendance_data, photo_url, work_name, header_cells)) in enumerate(zip(muster_urls, results)):
-        muster_data_cache[muster_url] = (attendance_data, photo_url, work_name, header_cells)
-        img_bytes = download_photo(photo_url) if photo_url else None
-        muster_roll_no = rows_to_save[i][0][muster_no_idx].get_text(strip=True)
-        print(f"Muster Roll No. {muster_roll_no} parsed ")
-        # Attendance Excel
-        if not attendance_header_written and header_cells:
-            if not first_muster_processed:
-                first_work_code = rows_to_save[i][0][workcode_idx].get_text(strip=True)
+    muster_urls = [urljoin(panchayath_url, href) for _, href in rows_to_save]
+    muster_roll_nos = [row[muster_no_idx].get_text(strip=True) for row, _ in rows_to_save]
+    resumed = sum(1 for url in muster_urls if journal.get_muster(url) is not None)
+    if resumed:
+        print(f"{resumed} of {len(muster_urls)} muster rolls already fetched, resuming")
+    progress.record_total(len(muster_urls))
+    executor = ThreadPoolExecutor(max_workers=max(1, workers))
+    try:
+        # map yields in muster roll order while later rolls are still downloading
+        results = executor.map(progress.bind(progress.current(), fetch_muster_roll), range(len(muster_urls)))
+
+        # The work code row sits above the data, so look ahead until the first
+        # muster roll with attendance; rolls read so far are replayed below
+        buffered = []
+        first_muster_processed = False
+        first_work_code = ''
+        first_work_name = ''
+        for result in results:
+            buffered.append(result)
+            _, _, work_name, header_cells = result[0]
+            if header_cells:
+                first_work_code = rows_to_save[len(buffered) - 1][0][workcode_idx].get_text(strip=True)
                 first_work_name = work_name or ''
-                ws.cell(row=workcode_row_idx_att, column=2, value=first_work_code)
-                ws.cell(row=workcode_row_idx_att, column=4, value=first_work_name)
                 first_muster_processed = True
-            ws.cell(row=row_cursor, column=1, value="Muster Roll No").font = Font(bold=True)
-            for col_idx, header in enumerate(header_cells, 2):
-                ws.cell(row=row_cursor, column=col_idx, value=header).font = Font(bold=True)
-            row_cursor += 1
-            attendance_header_written = True
-        if attendance_data:
-            for att_row in attendance_data:
-                ws.cell(row=row_cursor, column=1, value=muster_roll_no)
-                for col_idx, val in enumerate(att_row, 2):
-                    ws.cell(row=row_cursor, column=col_idx, value=val)
-                row_cursor += 1
-        if img_bytes:
-            img_bytes.seek(0)
-            img = XLImage(img_bytes)
-            img_cell = f"H{row_cursor-len(attendance_data) if attendance_data else row_cursor}"
-            ws.add_image(img, img_cell)
-            row_cursor += 3
+                break
+        results = chain(buffered, results)
+
+        # Excel setup
+        wb, ws = new_workbook(None, write_only)
+        att_rows = RowWriter(ws, write_only)
+        bold = Font(bold=True)
+        att_rows.write(1, [styled_cell(ws, "District:", bold), DISTRICT_LABEL, styled_cell(ws, "Taluk/Block:", bold), TALUK_NAME])
+        att_rows.write(2, [styled_cell(ws, "Panchayath:", bold), panchayath_name])
+        if first_muster_processed:
+            att_rows.write(3, [styled_cell(ws, "Work code:", bold), first_work_code, styled_cell(ws, "Work Name:", bold), first_work_name])
         else:
-            row_cursor += 2
-        row_cursor += 2
-        # Image-only Excel
-        start_img_row = img_row_cursor
-        img_ws.cell(row=img_row_cursor, column=1, value=muster_roll_no).font = Font(bold=True, size=18)
-        if img_bytes:
-            img_bytes.seek(0)
-            img_bytes_for_imgwb = io.BytesIO(img_bytes.getbuffer())
-            img2 = XLImage(img_bytes_for_imgwb)
-            img_ws.add_image(img2, f"B{img_row_cursor}")
-            img_bytes_refs.append(img_bytes_for_imgwb)
-            img_height_rows = 20
-            end_img_row = img_row_cursor + img_height_rows - 1
-            img_ws.merge_cells(start_row=start_img_row, start_column=1, end_row=end_img_row, end_column=1)
-            img_ws.cell(row=start_img_row, column=1).alignment = Alignment(vertical='center', horizontal='center')
-            img_row_cursor += img_height_rows
+            att_rows.write(3, [styled_cell(ws, "Work code:", bold), None, styled_cell(ws, "Work Name:", bold)])
+        row_cursor = 4
+        attendance_header_written = False
+
+        # Image-only Excel setup
+        img_wb, img_ws = new_workbook(None, write_only)
+        img_rows = RowWriter(img_ws, write_only)
+        img_rows.write(1, [styled_cell(img_ws, "District:", bold), DISTRICT_LABEL, styled_cell(img_ws, "Taluk/Block:", bold), TALUK_NAME])
+        img_rows.write(2, [styled_cell(img_ws, "Panchayath:", bold), panchayath_name])
+        if first_muster_processed:
+            img_rows.write(3, [styled_cell(img_ws, "Work code:", bold), None, styled_cell(img_ws, "Work Name:", bold)])
         else:
-            end_img_row = img_row_cursor
-            img_row_cursor += 3
-            img_ws.merge_cells(start_row=start_img_row, start_column=1, end_row=end_img_row, end_column=1)
-            img_ws.cell(row=start_img_row, column=1).alignment = Alignment(vertical='center', horizontal='center')
-        img_row_cursor += 2
-    if not first_muster_processed:
-        img_ws.cell(row=workcode_row_idx, column=2, value='')
-        img_ws.cell(row=workcode_row_idx, column=4, value='')
-    save_attendance_excel(wb, ws, img_wb, img_ws, panchayath_name, attendance_date)
-    save_raw_excel(rows_to_save, panchayath_name, attendance_date, muster_no_idx, workcode_idx, panchayath_url, muster_data_cache)
+            img_rows.write(3, [styled_cell(img_ws, "Work code:", bold), '', styled_cell(img_ws, "Work Name:", bold), ''])
+        img_rows.write(4, [styled_cell(img_ws, 'Muster Roll No', bold), styled_cell(img_ws, 'Image', bold)])
+        img_row_cursor = 5
+        # save_workbook stores each distinct photo once per workbook; rolls sharing one are flagged
+        photo_rolls = {}
+
+        for i, (muster_url, (result, img_bytes)) in enumerate(zip(muster_urls, results)):
+            with progress.phase('excel'):
+                attendance_data, photo_url, work_name, header_cells = result
+                # Only the rows are needed for the raw export, not the page's header and photo link
+                muster_data_cache[muster_url] = attendance_data
+                muster_roll_no = muster_roll_nos[i]
+                print(f"Muster Roll No. {muster_roll_no} parsed ")
+                # Attendance Excel
+                if not attendance_header_written and header_cells:
+                    att_rows.write(row_cursor, [styled_cell(ws, "Muster Roll No", bold)] + [styled_cell(ws, header, bold) for header in header_cells])
+                    row_cursor += 1
+                    attendance_header_written = True
+                if attendance_data:
+                    for att_row in attendance_data:
+                        att_rows.write(row_cursor, [muster_roll_no] + list(att_row))
+                        row_cursor += 1
+                if img_bytes:
+                    img = excel_image(img_bytes)
+                    img_cell = f"H{row_cursor-len(attendance_data) if attendance_data else row_cursor}"
+                    ws.add_image(img, img_cell)
+                    row_cursor += 3
+                else:
+                    row_cursor += 2
+                row_cursor += 2
+                # Image-only Excel
+                start_img_row = img_row_cursor
+                img_row = [styled_cell(img_ws, muster_roll_no, Font(bold=True, size=18), Alignment(vertical='center', horizontal='center'))]
+                if img_bytes:
+                    first_roll = photo_rolls.setdefault(img_bytes.digest, muster_roll_no)
+                    if first_roll != muster_roll_no:
+                        img_row += [None, f'Same photo as Muster Roll {first_roll}']
+                img_rows.write(img_row_cursor, img_row)
+                if img_bytes:
+                    img2 = excel_image(img_bytes)
+                    img_ws.add_image(img2, f"B{img_row_cursor}")
+                    img_height_rows = 20
+                    end_img_row = img_row_cursor + img_height_rows - 1
+                    img_rows.merge_first_column(start_img_row, end_img_row)
+                    img_row_cursor += img_height_rows
+                else:
+                    end_img_row = img_row_cursor
+                    img_row_cursor += 3
+                    img_rows.merge_first_column(start_img_row, end_img_row)
+                img_row_cursor += 2
+            progress.record_completed()
+    finally:
+        # An error or Ctrl+C while the workbooks are built drops the queued fetches
+        executor.shutdown(cancel_futures=True)
+    try:
+        save_attendance_excel(wb, ws, img_wb, img_ws, panchayath_name, attendance_date)
+    finally:
+        image_store.close()
+    if originals is not None:
+        zip_name = f"muster_roll_photos_{panchayath_name}_{attendance_date.replace('/', '_')}.zip"
+        with open(zip_name, 'wb') as f:
+            f.write(originals.close().getbuffer())
+        print(f"Saved {zip_name}")
+    raw_rows = save_raw_excel(rows_to_save, panchayath_name, attendance_date, muster_no_idx, workcode_idx, panchayath_url, muster_data_cache, write_only, table_format, summary)
+    if store_path:
+        ingest_rows(raw_rows, store_path)
+    journal.mark_complete()
+    return raw_rows
+
+def sync_panchayath(session, attendance_date, panchayath_name, panchayath_url, store, workers=MAX_WORKERS, table_format=None,
+                    nav_cache=None, page_parser=None):
+    # Fetches only the muster rolls listed for this date that no earlier sync stored
+    with progress.phase('navigation'):
+        muster_table = get_saved_muster_table(session, panchayath_url)
+    if muster_table is None:
+        if nav_cache is not None:
+            # Possibly a stale cached link; the next sync navigates from the top
+            nav_cache.forget(attendance_date)
+        return 0, 0
+    workcode_idx, muster_no_idx = find_muster_table_columns(muster_table)
+    if workcode_idx is None or muster_no_idx is None:
+        return 0, 0
+    listed = get_muster_roll_rows(muster_table, 'all', None, workcode_idx, muster_no_idx)
+    # Rolls stored by --store runs count as synced too, so they are not fetched and appended again
+    known = store.synced_musters(attendance_date, panchayath_name) | store.stored_musters(attendance_date, panchayath_name)
+    missing = []
+    for cols, muster_href in listed:
+        key = (cols[workcode_idx].get_text(strip=True), cols[muster_no_idx].get_text(strip=True))
+        if key not in known:
+            missing.append((key, urljoin(panchayath_url, muster_href)))
+    if not missing:
+        return 0, len(listed)
+
+    def fetch(muster_url):
+        # Never from the page cache: a cached empty page from before the date was past
+        # would otherwise be settled as empty for good
+        try:
+            return fetch_attendance_page(muster_url, page_parser=page_parser, ttl_seconds=0)
+        except requests.exceptions.RequestException as e:
+            print(f"Error fetching attendance data: {e}")
+            return None
+
+    progress.record_total(len(missing))
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        results = list(executor.map(progress.bind(progress.current(), fetch), [muster_url for _, muster_url in missing]))
+    progress.record_completed(len(missing))
+
+    # Failed fetches are retried next time; like the muster index, an empty roll
+    # only counts as done once its date is past
+    settled_if_empty = is_past_date(attendance_date)
+    new_rows = []
+    synced = []
+    for ((work_code, muster_roll_no), _), result in zip(missing, results):
+        if result is None:
+            continue
+        rows = [attendance_row(TALUK_NAME, panchayath_name, work_code, muster_roll_no, att_row) for att_row in result[0] or []]
+        if rows or settled_if_empty:
+            new_rows.extend(rows)
+            synced.append((work_code, muster_roll_no, len(rows)))
+    store.record_sync(attendance_date, panchayath_name, new_rows, synced)
+    if table_format == 'csv' and new_rows:
+        file_name = f"muster_rolls_raw_{panchayath_name}_{attendance_date.replace('/', '_')}.csv"
+        writer = CsvTableWriter(file_name, append=True)
+        try:
+            writer.write_rows(new_rows)
+        finally:
+            writer.close()
+        print(f"Appended {len(new_rows)} rows to {file_name}")
+    print(f"{panchayath_name} {attendance_date}: {len(synced)} new muster rolls, {len(listed) - len(missing)} already synced")
+    return len(synced), len(listed) - len(missing)
+
+def run_sync(session, form, panchayaths, dates, parallel, workers, store_path, table_format, fresh=False, page_parser=None):
+    # Unattended: every offered date and panchayath unless narrowed down, photos skipped
+    if table_format == 'parquet':
+        print("Parquet files cannot be appended to; sync only updates the database")
+    dates = select_dates(form.date_options(dates), dates)
+    fetched = skipped = 0
+    with AttendanceStore(store_path) as store:
+        for attendance_date in dates:
+            _, panch_links = get_block_panchayath_links(session, form, attendance_date, fresh)
+            if not panch_links:
+                continue
+
+            def process(panchayath_name):
+                try:
+                    return sync_panchayath(session, attendance_date, panchayath_name, panch_links[panchayath_name],
+                                           store, workers, table_format, form.nav_cache, page_parser)
+                except Exception as e:
+                    print(f"Error syncing {panchayath_name} on {attendance_date}: {e}")
+                    return 0, 0
+
+            with ThreadPoolExecutor(max_workers=max(1, parallel)) as executor:
+                selected = select_panchayaths(panch_links, panchayaths, attendance_date)
+                for new, known in executor.map(progress.bind(progress.current(), process), selected):
+                    fetched += new
+                    skipped += known
+    print(f"Sync complete: {fetched} new muster rolls stored in {store.path}, {skipped} already synced")
+
+def split_list(value):
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Download NMMS muster roll attendance for a Panchayath")
+    parser.add_argument('--sync', action='store_true',
+                        help="unattended: fetch only muster rolls not yet in the attendance database (see --store), "
+                             "for all offered dates and panchayaths unless --dates/--panchayaths narrow it down")
+    parser.add_argument('--panchayaths', type=split_list,
+                        help="batch mode: comma separated Panchayath names, or 'all' for the whole block")
+    parser.add_argument('--dates', type=split_list,
+                        help="batch mode: comma separated attendance dates (dd/mm/yyyy), or 'all'; defaults to all offered dates")
+    parser.add_argument('--workcode', help="batch mode: only muster rolls for this work code")
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS,
+                        help="muster pages and photos downloaded at the same time per panchayath (default %(default)s)")
+    parser.add_argument('--parse-workers', type=int, default=0,
+                        help="parse muster pages in this many processes instead of the download threads (default: off)")
+    parser.add_argument('--parallel', type=int, default=DEFAULT_PARALLEL_PANCHAYATHS,
+                        help="batch mode: number of panchayaths processed at the same time")
+    parser.add_argument('--max-per-host', type=int,
+                        help="most requests in flight to the portal at once "
+                             "(default: $NREGA_MAX_PER_HOST, else --workers times --parallel)")
+    parser.add_argument('--write-only', action='store_true',
+                        help="stream workbooks to disk with constant memory (for very large exports)")
+    parser.add_argument('--image-size', default=f"{IMAGE_MAX_SIZE[0]}x{IMAGE_MAX_SIZE[1]}",
+                        help="largest embedded photo size as WIDTHxHEIGHT pixels, or 'original' to embed as downloaded")
+    parser.add_argument('--jpeg-quality', type=int, default=JPEG_QUALITY, help="JPEG quality for resized photos")
+    parser.add_argument('--keep-original-images', action='store_true',
+                        help="also save the full-resolution photos as a zip archive")
+    parser.add_argument('--table-format', choices=TABLE_FORMATS,
+                        help="also write the raw attendance rows as CSV or Parquet (Parquet needs pyarrow)")
+    parser.add_argument('--summary', action='store_true',
+                        help="also write summary sheets: presence, person-days, gender split, absentee streaks (needs pandas)")
+    parser.add_argument('--store', nargs='?', const=DB_PATH, metavar='DB',
+                        help=f"also add the attendance rows to the local SQLite database (default {DB_PATH})")
+    parser.add_argument('--fresh', action='store_true',
+                        help="ignore the checkpoint journal of an earlier run and start over")
+    parser.add_argument('--instrument', action='store_true',
+                        help="time every stage and write a JSON timing report next to the workbooks")
+    parser.add_argument('--profile', choices=PROFILERS,
+                        help="also profile the whole run (implies --instrument); pyinstrument must be installed for it")
+    args = parser.parse_args()
+    if args.summary and not pandas_available():
+        parser.error("--summary needs pandas (pip install pandas)")
+    if args.summary and args.sync:
+        parser.error("--summary does not apply to --sync; summarize the database with attendance_store.py summary")
+    return args
+
+def cli():
+    args = parse_args()
+    image_max_size = None if args.image_size == 'original' else tuple(int(v) for v in args.image_size.lower().split('x'))
+    main(write_only=args.write_only, image_max_size=image_max_size, image_quality=args.jpeg_quality,
+         keep_originals=args.keep_original_images, fresh=args.fresh,
+         panchayaths=[name.upper() for name in args.panchayaths] if args.panchayaths else None,
+         dates=args.dates, choice='work' if args.workcode else 'all', workcode=args.workcode, parallel=args.parallel,
+         workers=args.workers, table_format=args.table_format,
+         store_path=args.store, sync=args.sync, instrument=args.instrument, profile=args.profile,
+         parse_workers=args.parse_workers, summary=args.summary, max_per_host=args.max_per_host)
 
 if __name__ == "__main__":
-    main()
+    cli()
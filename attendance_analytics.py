@@ -0,0 +1,185 @@
+from importlib.util import find_spec
+
+import progress
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from table_export import DATE_FORMAT
+
+# Supervisor summaries of the normalized attendance rows (table_export order),
+# computed column-wise with pandas group-bys instead of row by row: presence per
+# work and day, person-days per job card, work and panchayath, gender splits and
+# absentee streaks. A person-day is one worker marked present on one day.
+
+# table_export.ATTENDANCE_HEADER, as identifiers
+FRAME_COLUMNS = ['taluk', 'panchayath', 'work_code', 'muster_roll_no', 'job_card_no', 'worker_name', 'gender',
+                 'attendance', 'attendance_date']
+CATEGORY_COLUMNS = ['taluk', 'panchayath', 'work_code', 'muster_roll_no', 'gender', 'attendance']
+# Same key as the attendance store: a muster roll fetched twice counts once
+ROW_KEY = ['work_code', 'muster_roll_no', 'job_card_no', 'worker_name', 'attendance_date']
+# Absentee streaks shorter than this many recorded days are left out
+MIN_ABSENT_STREAK = 3
+
+SHEETS = {
+    'daily_presence': ('Daily Presence', ['Panchayath', 'Work Code', 'Attendance Date', 'Muster Rolls', 'Workers', 'Present', 'Absent', 'Present %']),
+    'job_cards': ('Person-days by Job Card', ['Panchayath', 'Job Card No', 'Workers', 'Days', 'Person-days', 'Absent', 'First Date', 'Last Date']),
+    'works': ('Person-days by Work', ['Panchayath', 'Work Code', 'Days', 'Muster Rolls', 'Workers', 'Person-days', 'Absent']),
+    'panchayaths': ('Person-days by Panchayath', ['Panchayath', 'Works', 'Workers', 'Person-days', 'Absent']),
+    'gender': ('Gender Split', None),
+    'absentee_streaks': ('Absentee Streaks', ['Panchayath', 'Job Card No', 'Worker Name', 'Absent Days', 'From', 'To', 'Ongoing']),
+}
+
+
+def pandas_available():
+    # pandas is optional and slow to import, so it is only looked up here
+    return find_spec('pandas') is not None
+
+
+def require_pandas():
+    # Imported on first use, not when the downloaders start
+    try:
+        import pandas
+    except ImportError:
+        raise RuntimeError("Attendance summaries need pandas (pip install pandas)") from None
+    return pandas
+
+
+def attendance_frame(rows):
+    # rows are table_export.ATTENDANCE_HEADER ordered lists
+    pd = require_pandas()
+    frame = pd.DataFrame(list(rows), columns=FRAME_COLUMNS)
+    for column in CATEGORY_COLUMNS:
+        frame[column] = frame[column].astype('category')
+    # The portal appends the capture time; a run holds a handful of distinct dates,
+    # so each distinct value is parsed once
+    days = frame['attendance_date'].astype('category')
+    parsed = pd.to_datetime(days.cat.categories.str.split().str[0], format=DATE_FORMAT, errors='coerce')
+    frame['attendance_date'] = pd.Series(parsed[days.cat.codes], index=frame.index).where(days.cat.codes >= 0)
+    frame = frame.dropna(subset=['attendance_date']).drop_duplicates(ROW_KEY, keep='last')
+    frame['present'] = frame['attendance'].astype(str).str.upper().str.startswith('P')
+    # One id per worker (job card member) for distinct counts and streaks
+    frame['worker'] = frame.groupby(['job_card_no', 'worker_name'], sort=False).ngroup()
+    return frame.reset_index(drop=True)
+
+
+def daily_presence(frame):
+    summary = frame.groupby(['panchayath', 'work_code', 'attendance_date'], observed=True).agg(
+        muster_rolls=('muster_roll_no', 'nunique'), workers=('worker', 'size'), present=('present', 'sum'))
+    summary['absent'] = summary['workers'] - summary['present']
+    summary['present_pct'] = (summary['present'] * 100 / summary['workers']).round(1)
+    return summary.reset_index()
+
+
+def job_card_person_days(frame):
+    summary = frame.groupby(['panchayath', 'job_card_no'], observed=True).agg(
+        workers=('worker', 'nunique'), days=('attendance_date', 'nunique'), person_days=('present', 'sum'),
+        records=('present', 'size'), first_date=('attendance_date', 'min'), last_date=('attendance_date', 'max'))
+    summary.insert(3, 'absent', summary.pop('records') - summary['person_days'])
+    return summary.reset_index()
+
+
+def work_person_days(frame):
+    summary = frame.groupby(['panchayath', 'work_code'], observed=True).agg(
+        days=('attendance_date', 'nunique'), muster_rolls=('muster_roll_no', 'nunique'), workers=('worker', 'nunique'),
+        person_days=('present', 'sum'), records=('present', 'size'))
+    summary['absent'] = summary.pop('records') - summary['person_days']
+    return summary.reset_index()
+
+
+def panchayath_person_days(frame):
+    summary = frame.groupby('panchayath', observed=True).agg(
+        works=('work_code', 'nunique'), workers=('worker', 'nunique'), person_days=('present', 'sum'),
+        records=('present', 'size'))
+    summary['absent'] = summary.pop('records') - summary['person_days']
+    return summary.reset_index()
+
+
+def gender_split(frame):
+    # Person-days per gender as columns, one row per work
+    split = frame.groupby(['panchayath', 'work_code', 'gender'], observed=True)['present'].sum().unstack(fill_value=0)
+    split.columns = [f"Person-days {gender or 'Unknown'}" for gender in split.columns]
+    split['Person-days'] = split.sum(axis=1)
+    return split.reset_index()
+
+
+def absentee_streaks(frame, min_days=MIN_ABSENT_STREAK):
+    # Runs of consecutive days a worker is on a muster roll but marked absent. Only
+    # days the worker appears count: rolls list the workers engaged on the work, so a
+    # day without any roll for them is not an absence. A worker on two rolls the same
+    # day is present if either roll says so.
+    days = frame.groupby(['worker', 'attendance_date'], observed=True)['present'].max().reset_index()
+    new_run = days['worker'].ne(days['worker'].shift()) | days['present'].ne(days['present'].shift())
+    days['run'] = new_run.cumsum()
+    last_day = days.groupby('worker')['attendance_date'].transform('max')
+    absent = days[~days['present']].assign(last_day=last_day[~days['present']])
+    runs = absent.groupby('run').agg(
+        worker=('worker', 'first'), absent_days=('attendance_date', 'size'), start=('attendance_date', 'min'),
+        end=('attendance_date', 'max'), last_day=('last_day', 'first'))
+    runs = runs[runs['absent_days'] >= min_days]
+    runs['ongoing'] = runs['end'] == runs['last_day']
+    workers = frame.drop_duplicates('worker').set_index('worker')[['panchayath', 'job_card_no', 'worker_name']]
+    runs = runs.join(workers, on='worker')
+    runs = runs.sort_values(['absent_days', 'end'], ascending=[False, False])
+    return runs[['panchayath', 'job_card_no', 'worker_name', 'absent_days', 'start', 'end', 'ongoing']].reset_index(drop=True)
+
+
+def summarize(rows):
+    # Every summary as a DataFrame, keyed like SHEETS
+    with progress.phase('summary'):
+        frame = attendance_frame(rows)
+        return {
+            'daily_presence': daily_presence(frame),
+            'job_cards': job_card_person_days(frame),
+            'works': work_person_days(frame),
+            'panchayaths': panchayath_person_days(frame),
+            'gender': gender_split(frame),
+            'absentee_streaks': absentee_streaks(frame),
+        }
+
+
+def sheet_rows(summary):
+    # Plain Python values column by column: dates as dates, NumPy scalars as int/float
+    pd = require_pandas()
+    columns = []
+    for name in summary.columns:
+        column = summary[name]
+        if pd.api.types.is_datetime64_any_dtype(column):
+            column = column.dt.date
+        elif isinstance(column.dtype, pd.CategoricalDtype):
+            column = column.astype(object)
+        columns.append(column.tolist())
+    return zip(*columns)
+
+
+def write_summary_excel(summaries, target, write_only=False):
+    # One sheet per summary; target is a file name or a binary file object
+    with progress.phase('excel'):
+        wb = Workbook(write_only=write_only)
+        bold = Font(bold=True)
+        for index, (key, (title, header)) in enumerate(SHEETS.items()):
+            summary = summaries[key]
+            if index or write_only:
+                ws = wb.create_sheet(title)
+            else:
+                ws = wb.active
+                ws.title = title
+            if header is None:
+                header = ['Panchayath', 'Work Code'] + list(summary.columns[2:])
+            header_cells = []
+            for name in header:
+                cell = WriteOnlyCell(ws, value=name)
+                cell.font = bold
+                header_cells.append(cell)
+            ws.append(header_cells)
+            for row in sheet_rows(summary):
+                ws.append(list(row))
+    with progress.phase('save'):
+        wb.save(target)
+
+
+def save_summary_excel(rows, file_name, write_only=False):
+    summaries = summarize(rows)
+    write_summary_excel(summaries, file_name, write_only)
+    print(f"Saved {file_name}")
+    return summaries
+
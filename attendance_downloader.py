@@ -1,269 +1,587 @@
 import io
 import requests
+import progress
+from attendance_analytics import require_pandas, summarize, write_summary_excel
+from instrumentation import ThreadProfiler, report_json, timing_report
+from attendance_store import ingest_rows
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from urllib.parse import parse_qsl, urlsplit
+from http_cache import CURRENT_HTML_TTL_SECONDS, cache_lookup, cache_store, cached_fetch, html_cache, image_cache
+from http_client import get_session, http_get
+from image_processing import IMAGE_MAX_SIZE, JPEG_QUALITY, ImageProcessor, OriginalsArchive
+from excel_media import save_workbook
+from image_store import ImageStore, image_view, photo_digest
+from muster_index import FORM_WITH_WORKCODE, FORM_WITHOUT_WORKCODE, MusterIndex, is_past_date
+from muster_parser import PageParser, is_no_data_page, parse_muster_page
+from table_export import DATE_FORMAT, attendance_row, write_table
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.drawing.image import Image as XLImage
-from bs4 import BeautifulSoup
 from openpyxl.styles import Alignment, Font
 
 STARTING_URL = "https://mnregaweb4.nic.in/nregaarch/View_NMMS_atten_date_dtl_rpt.aspx?page=&short_name=KN&state_name=KARNATAKA&state_code=15&district_name=BALLARI&district_code=1505&block_name=SIRUGUPPA&block_code=1505007&"
 DEFAULT_DISTRICT = "Ballari"
 DEFAULT_TALUK = "Siruguppa"
+DEFAULT_MAX_WORKERS = 8
+# Sparse probe spacing for muster roll discovery; rolls of one work are numbered in runs
+DISCOVERY_STEP = 10
+# Longest attendance date range one run fetches
+MAX_DATE_RANGE_DAYS = 31
 
 
-def get_attendance_data(url):
+def fetch_content(url):
+    response = http_get(url)
+    response.raise_for_status()
+    return response.content
+
+
+def is_final_page(url):
+    # Rolls for a past AttendanceDate are final
+    for key, value in parse_qsl(urlsplit(url).query):
+        if key.lower() == 'attendancedate' and is_past_date(value):
+            return True
+    return False
+
+
+def page_ttl(url):
+    # Final pages keep the cache's TTL (no expiry); today's rolls can still be filled
+    # in, so those pages (and pages without a date) expire in minutes
+    return None if is_final_page(url) else CURRENT_HTML_TTL_SECONDS
+
+
+def parse_page(content, parser_backend=None, page_parser=None):
+    with progress.phase('parse'):
+        if page_parser is not None:
+            return page_parser(content)
+        return parse_muster_page(content, parser_backend)
+
+
+def load_attendance_page(url, parser_backend=None, page_parser=None, ttl_seconds=None):
+    # Returns the parsed page and the page bytes if they came from the network (None
+    # for a cache hit). A final page is only cached, and only served from the cache,
+    # with attendance rows in it: an empty, error or maintenance page is fetched again
+    # on the next run instead of being kept for good.
+    final = is_final_page(url)
+    with progress.phase('fetch'):
+        content = cache_lookup(html_cache, url, page_ttl(url) if ttl_seconds is None else ttl_seconds)
+    if content is not None:
+        result = parse_page(content, parser_backend, page_parser)
+        if result[0] or not final:
+            return result, None
+        html_cache.discard(url)
+    with progress.phase('fetch'):
+        content = fetch_content(url)
+    result = parse_page(content, parser_backend, page_parser)
+    if result[0] or not final:
+        cache_store(html_cache, url, content)
+    return result, content
+
+
+def fetch_attendance_page(url, parser_backend=None, page_parser=None, ttl_seconds=None):
+    # page_parser (a PageParser) hands the page to its parse processes; ttl_seconds
+    # overrides page_ttl (0 skips the cache lookup)
+    return load_attendance_page(url, parser_backend, page_parser, ttl_seconds)[0]
+
+
+def get_attendance_data(url, parser_backend=None):
     try:
-        response = requests.get(url)
-        response.raise_for_status()
+        return fetch_attendance_page(url, parser_backend)
     except requests.exceptions.RequestException as e:
         print(f"Error fetching attendance data: {e}")
         return None, None, None, None
-    soup = BeautifulSoup(response.content, 'html.parser')
-    # Extract work name
-    work_name = None
-    for b in soup.find_all('b'):
-        if b.text.strip().startswith('Work Name'):
-            next_text = b.next_sibling
-            if next_text:
-                work_name = str(next_text).strip(' :\u00a0-')
-            break
-    if not work_name:
-        work_name_elem = soup.find(id="ContentPlaceHolder1_lbl_dtl")
-        if work_name_elem:
-            work_name = work_name_elem.text.strip()
-    # Attendance Table
-    attendance_data = []
-    tables = soup.find_all('table')
-    if not tables:
-        print("No tables found on the page.")
-        return None, None, work_name, None
-    attendance_table = tables[-1]
-    rows = attendance_table.find_all('tr')
-    header_cells = [th.text.strip() for th in rows[0].find_all(['th', 'td'])]
-    col_map = {name: idx for idx, name in enumerate(header_cells)}
-    for row in rows[1:]:
-        cols = row.find_all('td')
-        if cols and any(c.get_text(strip=True) for c in cols):
-            name_td = ''
-            for td in cols:
-                span = td.find('span', id=lambda x: x and 'lbl_workerName_' in x)
-                if span:
-                    name_td = span.get_text(strip=True)
-                    break
-            extracted = [
-                cols[col_map.get('S.No', -1)].get_text(strip=True) if 'S.No' in col_map else '',
-                cols[col_map.get('Job Card No', -1)].get_text(strip=True) if 'Job Card No' in col_map else '',
-                name_td,
-                cols[col_map.get('Attendance Date', -1)].get_text(strip=True) if 'Attendance Date' in col_map else '',
-                cols[col_map.get('Present/Absent', -1)].get_text(strip=True) if 'Present/Absent' in col_map else ''
-            ]
-            attendance_data.append(extracted)
-    photo_url = None
-    img_link = soup.find('a', text='Click here for large image')
-    if img_link and img_link.has_attr('href'):
-        photo_url = img_link['href']
-    return attendance_data, photo_url, work_name, header_cells
 
 
-def download_photo(url):
+def download_photo_bytes(url):
     if not url:
         return None
     try:
-        response = requests.get(url, stream=True)
-        response.raise_for_status()
-        img_bytes = io.BytesIO(response.content)
-        return img_bytes
+        with progress.phase('photo'):
+            return cached_fetch(image_cache, url, fetch_content)
     except requests.exceptions.RequestException as e:
         print(f"Error downloading photo: {e}")
         return None
 
 
-def write_attendance_excel(attendance_records, work_code, work_name, panchayat_name, file_base):
-    wb = Workbook()
-    ws = wb.active
-    ws.title = 'Attendance Data'
+def store_photo(url, image_store, image_processor=None, originals=None, original_name=None):
+    # Each distinct photo is downloaded, resized and stored once per run: a URL seen
+    # before maps straight to its stored image, and the same bytes under another URL
+    # share the first copy. With originals every roll's download is archived.
+    if originals is None:
+        stored = image_store.get_url(url)
+        if stored is not None:
+            return stored
+    photo = download_photo_bytes(url)
+    if originals is not None:
+        originals.add(original_name, photo)
+    if not photo:
+        return None
+    digest = photo_digest(photo)
+    stored = image_store.get(digest)
+    if stored is None:
+        if image_processor is not None:
+            with progress.phase('photo'):
+                photo = image_processor(photo)
+        stored = image_store.put(photo, digest)
+    image_store.index_url(url, digest)
+    return stored
+
+
+def download_photo(url):
+    content = download_photo_bytes(url)
+    return io.BytesIO(content) if content is not None else None
+
+
+def new_workbook(title, write_only=False):
+    # write_only workbooks stream rows to a temp file as they are appended, so memory
+    # stays flat no matter how many rows are written. Rows can then only be appended,
+    # and column widths / row heights must be set before the row is written.
+    wb = Workbook(write_only=write_only)
+    if write_only:
+        ws = wb.create_sheet(title)
+    else:
+        ws = wb.active
+        if title:
+            ws.title = title
+    return wb, ws
+
+
+def date_sheet_title(title, attendance_date):
+    # Sheet titles may not contain '/' (and are capped at 31 characters)
+    return f"{title} {attendance_date.replace('/', '-')}"
+
+
+def muster_sheets(title, musters, write_only=False):
+    # A workbook with one sheet for a single-date run, or one sheet per attendance
+    # date (in run order) for a date range; returns the workbook and (sheet, musters) pairs
+    by_date = {}
+    for muster in musters:
+        by_date.setdefault(muster.attendance_date, []).append(muster)
+    if len(by_date) <= 1:
+        wb, ws = new_workbook(title, write_only)
+        return wb, [(ws, musters)]
+    dates = list(by_date)
+    wb, ws = new_workbook(date_sheet_title(title, dates[0]), write_only)
+    sheets = [(ws, by_date[dates[0]])]
+    for attendance_date in dates[1:]:
+        sheets.append((wb.create_sheet(date_sheet_title(title, attendance_date)), by_date[attendance_date]))
+    return wb, sheets
+
+
+def styled_cell(ws, value, font=None, alignment=None):
+    cell = WriteOnlyCell(ws, value=value)
+    if font:
+        cell.font = font
+    if alignment:
+        cell.alignment = alignment
+    return cell
+
+
+def append_header_block(ws, work_code, work_name, panchayat_name):
     ws.append([f'Work Code: {work_code}'])
     ws.append([f'Work Name: {work_name if work_name else ""}'])
     ws.append([f'District: {DEFAULT_DISTRICT}'])
     ws.append([f'Taluk/Block: {DEFAULT_TALUK}'])
     ws.append([f'Panchayath Name: {panchayat_name}'])
     ws.append([])
-    for record in attendance_records:
-        ws.append([record['muster_roll_no']] + record['row'])
+    return 6
+
+
+def excel_image(image):
+    # save_workbook stores a photo embedded several times once per workbook
+    with progress.phase('image'):
+        return XLImage(image_view(image))
+
+
+def reused_photos(musters):
+    # Muster rolls whose photo is identical to an earlier roll's, mapped to that roll
+    first = {}
+    reused = {}
+    for muster in musters:
+        digest = getattr(muster.image, 'digest', None)
+        if digest is None:
+            continue
+        earlier = first.setdefault(digest, muster)
+        if earlier is not muster:
+            reused[muster] = earlier
+    return reused
+
+
+def reuse_note(muster, earlier):
+    note = f'Same photo as Muster Roll {earlier.muster_roll_no}'
+    if earlier.attendance_date != muster.attendance_date:
+        note += f' ({earlier.attendance_date})'
+    return note
+
+
+class MusterRoll:
+    # One fetched muster roll: its parsed AttendanceRecords and photo, read by all
+    # three workbooks and the table export
+    __slots__ = ('muster_roll_no', 'rows', 'image', 'attendance_date')
+
+    def __init__(self, muster_roll_no, rows, image, attendance_date=None):
+        self.muster_roll_no = muster_roll_no
+        self.rows = rows or ()
+        self.image = image
+        # The date the roll was requested for; date-range runs get one sheet per date
+        self.attendance_date = attendance_date
+
+
+def write_attendance_excel(musters, work_code, work_name, panchayat_name, file_base, write_only=False):
+    wb, sheets = muster_sheets('Attendance Data', musters, write_only)
+    for ws, sheet_musters in sheets:
+        append_header_block(ws, work_code, work_name, panchayat_name)
+        for muster in sheet_musters:
+            for row in muster.rows:
+                ws.append([muster.muster_roll_no, *row])
     print(f'Saved attendance_data_{file_base}.xlsx')
     return wb
 
 
-def write_images_excel(image_records, work_code, work_name, panchayat_name, file_base):
-    wb = Workbook()
-    ws = wb.active
-    ws.title = 'Images'
-    ws.append([f'Work Code: {work_code}'])
-    ws.append([f'Work Name: {work_name if work_name else ""}'])
-    ws.append([f'District: {DEFAULT_DISTRICT}'])
-    ws.append([f'Taluk/Block: {DEFAULT_TALUK}'])
-    ws.append([f'Panchayath Name: {panchayat_name}'])
-    ws.append([])
-    ws.append(['Muster Roll No.', 'Image'])
-    img_row = ws.max_row + 1
-    img_refs = []
-    for entry in image_records:
-        muster_no = entry['muster_roll_no']
-        img_bytes = entry['image']
-        if img_bytes:
-            img_bytes.seek(0)
-            img_data = img_bytes.read()
-            img_bytes_for_excel = io.BytesIO(img_data)
-            xl_img = XLImage(img_bytes_for_excel)
-            img_refs.append(img_bytes_for_excel)
-            cell = ws.cell(row=img_row, column=1, value=muster_no)
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-            cell.font = Font(size=16, bold=True)
-            cell_ref = f'B{img_row}'
-            ws.add_image(xl_img, cell_ref)
-            try:
-                from PIL import Image as PILImage
-                img_bytes_for_excel.seek(0)
-                pil_img = PILImage.open(img_bytes_for_excel)
-                img_height_px = pil_img.height
-                img_height_pt = img_height_px * 0.75
-                ws.row_dimensions[img_row].height = img_height_pt
-                ws.column_dimensions['B'].width = 20
-            except Exception:
-                pass
-        else:
-            cell = ws.cell(row=img_row, column=1, value=muster_no)
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-            cell.font = Font(size=16, bold=True)
-            ws.cell(row=img_row, column=2, value='No Image')
-        img_row += 1
+def write_images_excel(musters, work_code, work_name, panchayat_name, file_base, write_only=False):
+    wb, sheets = muster_sheets('Images', musters, write_only)
+    reused = reused_photos(musters)
+    for ws, sheet_musters in sheets:
+        ws.column_dimensions['B'].width = 20
+        img_row = append_header_block(ws, work_code, work_name, panchayat_name)
+        ws.append(['Muster Roll No.', 'Image'])
+        img_row += 2
+        for muster in sheet_musters:
+            muster_no = muster.muster_roll_no
+            img_bytes = muster.image
+            muster_cell = styled_cell(ws, muster_no, Font(size=16, bold=True), Alignment(horizontal='center', vertical='center'))
+            if img_bytes:
+                xl_img = excel_image(img_bytes)
+                ws.add_image(xl_img, f'B{img_row}')
+                # XLImage already read the pixel size through PIL
+                ws.row_dimensions[img_row].height = xl_img.height * 0.75
+                if muster in reused:
+                    # Flag photos uploaded to more than one muster roll
+                    ws.append([muster_cell, None, reuse_note(muster, reused[muster])])
+                else:
+                    ws.append([muster_cell])
+            else:
+                ws.append([muster_cell, 'No Image'])
+            img_row += 1
     print(f'Saved attendance_images_{file_base}.xlsx')
     return wb
 
 
-def write_attendance_images_excel(option_c_records, work_code, work_name, panchayat_name, file_base):
-    wb = Workbook()
-    ws = wb.active
-    ws.title = 'Attendance+Images'
-    ws.append([f'Work Code: {work_code}'])
-    ws.append([f'Work Name: {work_name if work_name else ""}'])
-    ws.append([f'District: {DEFAULT_DISTRICT}'])
-    ws.append([f'Taluk/Block: {DEFAULT_TALUK}'])
-    ws.append([f'Panchayath Name: {panchayat_name}'])
-    ws.append([])
+def write_attendance_images_excel(musters, work_code, work_name, panchayat_name, file_base, write_only=False):
+    wb, sheets = muster_sheets('Attendance+Images', musters, write_only)
     table_header = ['Muster Roll No.', 'S.No', 'Job Card No', 'Worker Name(Gender)', 'Attendance Date', 'Present/Absent', 'Image']
-    ws.append(table_header)
-    img_refs = []
-    for entry in option_c_records:
-        muster_no = entry['muster_roll_no']
-        att_rows = entry['attendance']
-        img_bytes = entry['image']
-        first_row = True
-        if att_rows:
-            for row in att_rows:
-                if len(row) >= 4 and row[3]:
-                    row[3] = ' '.join(row[3].split()[:3])
-                excel_row = [muster_no if first_row else '',
-                             row[0] if len(row) > 0 else '',
-                             row[1] if len(row) > 1 else '',
-                             row[2] if len(row) > 2 else '',
-                             row[3] if len(row) > 3 else '',
-                             row[4] if len(row) > 4 else '',
-                             '']
-                if first_row:
-                    if img_bytes:
-                        img_bytes.seek(0)
-                        img_data = img_bytes.read()
-                        img_bytes_for_excel = io.BytesIO(img_data)
-                        xl_img = XLImage(img_bytes_for_excel)
-                        img_refs.append(img_bytes_for_excel)
-                        row_idx = ws.max_row + 1
-                        ws.append(excel_row)
-                        cell_ref = f'G{row_idx}'
-                        ws.add_image(xl_img, cell_ref)
-                        ws.row_dimensions[row_idx].height = 100
-                        ws.column_dimensions['G'].width = 20
-                    else:
-                        ws.append(excel_row)
-                    first_row = False
-                else:
-                    ws.append(excel_row)
-        else:
-            excel_row = [muster_no, '', '', '', '', '', '']
+    for ws, sheet_musters in sheets:
+        ws.column_dimensions['G'].width = 20
+        row_idx = append_header_block(ws, work_code, work_name, panchayat_name)
+        ws.append(table_header)
+        row_idx += 2
+        for muster in sheet_musters:
+            muster_no = muster.muster_roll_no
+            img_bytes = muster.image
+            excel_rows = []
+            for row in muster.rows:
+                att_date = row[3] if len(row) > 3 else ''
+                if att_date:
+                    att_date = ' '.join(att_date.split()[:3])
+                excel_rows.append(['' if excel_rows else muster_no,
+                                   row[0] if len(row) > 0 else '',
+                                   row[1] if len(row) > 1 else '',
+                                   row[2] if len(row) > 2 else '',
+                                   att_date,
+                                   row[4] if len(row) > 4 else '',
+                                   ''])
+            if not excel_rows:
+                excel_rows.append([muster_no, '', '', '', '', '', ''])
             if img_bytes:
-                img_bytes.seek(0)
-                img_data = img_bytes.read()
-                img_bytes_for_excel = io.BytesIO(img_data)
-                xl_img = XLImage(img_bytes_for_excel)
-                img_refs.append(img_bytes_for_excel)
-                row_idx = ws.max_row + 1
-                ws.append(excel_row)
-                cell_ref = f'G{row_idx}'
-                ws.add_image(xl_img, cell_ref)
+                ws.add_image(excel_image(img_bytes), f'G{row_idx}')
                 ws.row_dimensions[row_idx].height = 100
-                ws.column_dimensions['G'].width = 20
-            else:
+            for excel_row in excel_rows:
                 ws.append(excel_row)
+            row_idx += len(excel_rows)
     print(f'Saved attendance_with_images_{file_base}.xlsx')
     return wb
 
 
-def run_attendance_downloader(panchayat_name, panchayat_code, fin_year, work_code, msr_start, msr_end, attendance_date, digest, progress_callback=None):
-    attendance_records = []
-    image_records = []
-    option_c_records = []
+def export_workbooks(musters, work_code, work_name, panchayat_name, file_base, write_only=False):
+    with progress.phase('excel'):
+        att_wb = write_attendance_excel(musters, work_code, work_name, panchayat_name, file_base, write_only)
+        img_wb = write_images_excel(musters, work_code, work_name, panchayat_name, file_base, write_only)
+        optc_wb = write_attendance_images_excel(musters, work_code, work_name, panchayat_name, file_base, write_only)
+
+    with progress.phase('save'):
+        att_xlsx = io.BytesIO()
+        att_wb.save(att_xlsx)
+        att_xlsx.seek(0)
+        img_xlsx = io.BytesIO()
+        save_workbook(img_wb, img_xlsx)
+        img_xlsx.seek(0)
+        optc_xlsx = io.BytesIO()
+        save_workbook(optc_wb, optc_xlsx)
+        optc_xlsx.seek(0)
+    return att_xlsx, img_xlsx, optc_xlsx
+
+
+def attendance_table_rows(musters, work_code, panchayat_name):
+    # Same normalized rows as attend_2way's raw export
+    for muster in musters:
+        muster_roll_no = str(muster.muster_roll_no)
+        for row in muster.rows:
+            yield attendance_row(DEFAULT_TALUK, panchayat_name, work_code, muster_roll_no, row)
+
+
+def export_table(musters, work_code, panchayat_name, table_format):
+    table = io.BytesIO()
+    write_table(attendance_table_rows(musters, work_code, panchayat_name), table, table_format)
+    table.seek(0)
+    return table
+
+
+def build_muster_urls(panchayat_name, panchayat_code, fin_year, work_code, msr_no, attendance_date, digest):
+    url_with_workcode = (
+        f"{STARTING_URL}"
+        f"panchayat_name={panchayat_name}&panchayat_code={panchayat_code}"
+        f"&fin_year={fin_year}"
+        f"&source=&work_code={work_code}"
+        f"&msr_no={msr_no}"
+        f"&AttendanceDate={attendance_date}"
+        f"&Digest={digest}"
+    )
+    url_without_workcode = (
+        f"{STARTING_URL}"
+        f"panchayat_name={panchayat_name}&panchayat_code={panchayat_code}"
+        f"&fin_year={fin_year}"
+        f"&source="
+        f"&msr_no={msr_no}"
+        f"&AttendanceDate={attendance_date}"
+        f"&Digest={digest}"
+    )
+    return url_with_workcode, url_without_workcode
+
+
+def fetch_muster_page(msr_no, panchayat_name, panchayat_code, fin_year, work_code, attendance_date, digest, muster_index=None, page_parser=None):
+    return load_muster_page(msr_no, panchayat_name, panchayat_code, fin_year, work_code, attendance_date, digest, muster_index, page_parser)[0]
+
+
+def load_muster_page(msr_no, panchayat_name, panchayat_code, fin_year, work_code, attendance_date, digest, muster_index=None, page_parser=None):
+    # Returns the parsed page and whether it is empty only because a fetch failed
+    if muster_index and muster_index.is_known_empty(msr_no):
+        return (None, None, None, None), False
+    url_with_workcode, url_without_workcode = build_muster_urls(
+        panchayat_name, panchayat_code, fin_year, work_code, msr_no, attendance_date, digest
+    )
+    forms = [(FORM_WITH_WORKCODE, url_with_workcode), (FORM_WITHOUT_WORKCODE, url_without_workcode)]
+    learned_form = muster_index.url_form if muster_index else None
+    if learned_form:
+        forms = [(form, url) for form, url in forms if form == learned_form]
+    att_data, photo_url, wname, headers = None, None, None, None
+    # Remembered as empty only if every form tried got the portal's own "no data"
+    # page from the network: not a cached page, an error page or a failed request
+    confirmed_empty = True
+    failed = False
+    for form, url in forms:
+        try:
+            (att_data, photo_url, wname, headers), content = load_attendance_page(url, page_parser=page_parser)
+        except requests.exceptions.RequestException as e:
+            print(f"Error fetching attendance data: {e}")
+            progress.record_fetch_error(f"muster roll {msr_no} ({attendance_date})")
+            att_data, photo_url, wname, headers = None, None, None, None
+            confirmed_empty = False
+            failed = True
+            continue
+        if content is None or not is_no_data_page(content):
+            confirmed_empty = False
+        if att_data:
+            if muster_index:
+                muster_index.record_form(form)
+            break
+    if learned_form and (learned_form == FORM_WITHOUT_WORKCODE or not att_data):
+        # Without the learned form this roll would have tried both URLs
+        muster_index.record_single_form_fetch()
+    if muster_index and not att_data and confirmed_empty:
+        muster_index.mark_empty(msr_no)
+    return (att_data, photo_url, wname, headers), failed and not att_data
+
+
+def fetch_muster_roll(msr_no, panchayat_name, panchayat_code, fin_year, work_code, attendance_date, digest, muster_index=None, image_store=None, image_processor=None, originals=None, page_parser=None, photo_name=None):
+    att_data, photo_url, wname, headers = fetch_muster_page(
+        msr_no, panchayat_name, panchayat_code, fin_year, work_code, attendance_date, digest, muster_index, page_parser
+    )
+    if image_store is not None:
+        img_bytes = None
+        if photo_url:
+            img_bytes = store_photo(photo_url, image_store, image_processor, originals, photo_name or f"muster_{msr_no}.jpg")
+    else:
+        img_bytes = download_photo(photo_url) if photo_url else None
+    return msr_no, att_data, photo_url, wname, headers, img_bytes
+
+
+def discover_muster_numbers(panchayat_name, panchayat_code, fin_year, work_code, msr_start, msr_end, attendance_date, digest, step=DISCOVERY_STEP, max_workers=DEFAULT_MAX_WORKERS, muster_index=None, tracker=None, page_parser=None):
+    # Sparse probe every `step` numbers, then probe densely around each hit until a
+    # cluster is surrounded by `step` empty numbers on both sides. Probed pages land in
+    # the HTML cache, so fetching the discovered rolls afterwards costs no extra requests.
+    # A probe whose fetch failed is not an empty number: it is probed once more and, if
+    # it still fails, its neighbours are probed densely and it is fetched with the hits.
+    step = max(1, step)
+    probed = set()
+    found = set()
+    unresolved = set()
+
+    def probe(numbers, again=False):
+        if not again:
+            numbers = [n for n in numbers if msr_start <= n <= msr_end and n not in probed]
+            probed.update(numbers)
+        pages = executor.map(
+            progress.bind(tracker, lambda msr_no: load_muster_page(msr_no, panchayat_name, panchayat_code, fin_year, work_code, attendance_date, digest, muster_index, page_parser)),
+            numbers,
+        )
+        hits, failed = [], []
+        for msr_no, (page, fetch_failed) in zip(numbers, pages):
+            if page[0]:
+                hits.append(msr_no)
+            elif fetch_failed:
+                failed.append(msr_no)
+        return hits, failed
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        frontier, failed = probe(range(msr_start, msr_end + 1, step))
+        while frontier or failed:
+            if failed:
+                hits, failed = probe(failed, again=True)
+                frontier += hits
+                unresolved.update(failed)
+            found.update(frontier)
+            neighbours = set()
+            for msr_no in frontier + failed:
+                neighbours.update(range(msr_no - step + 1, msr_no + step))
+            frontier, failed = probe(sorted(neighbours))
+    msg = f"Discovered {len(found)} muster rolls after probing {len(probed)} of {msr_end - msr_start + 1} numbers"
+    if unresolved:
+        msg += (f"; could not fetch {len(unresolved)} ({', '.join(map(str, sorted(unresolved)))}), "
+                f"trying them again with the muster rolls found")
+    if tracker is not None:
+        tracker.log(msg)
+    else:
+        print(msg)
+    return sorted(found | unresolved)
+
+
+def date_range(start, end=None):
+    # Attendance dates (dd/mm/yyyy) from start to end inclusive
+    if not end or end == start:
+        return [start]
+    first = datetime.strptime(start, DATE_FORMAT).date()
+    last = datetime.strptime(end, DATE_FORMAT).date()
+    days = (last - first).days + 1
+    if days < 1:
+        raise ValueError(f"End date {end} is before start date {start}")
+    if days > MAX_DATE_RANGE_DAYS:
+        raise ValueError(f"Date range {start} to {end} spans {days} days, at most {MAX_DATE_RANGE_DAYS} are allowed")
+    return [(first + timedelta(days=offset)).strftime(DATE_FORMAT) for offset in range(days)]
+
+
+def run_attendance_downloader(panchayat_name, panchayat_code, fin_year, work_code, msr_start, msr_end, attendance_date, digest, progress_callback=None, max_workers=DEFAULT_MAX_WORKERS, discover=False, write_only=False, image_max_size=IMAGE_MAX_SIZE, image_quality=JPEG_QUALITY, image_workers=0, keep_originals=False, table_format=None, store_path=None, instrument=False, profile=None, parse_workers=0, end_date=None, summary=False, max_per_host=None, fresh=False):
+    # progress_callback, if given, receives ProgressTracker.snapshot() dicts.
+    # instrument (or a profile) adds a JSON timing report to the returned files.
+    # end_date fetches every date from attendance_date to end_date in one run.
+    # summary adds a workbook of presence, person-days and absentee streak sheets.
+    # max_per_host caps requests in flight to the portal (default: max_workers).
+    # fresh probes muster numbers earlier runs found empty again.
+    attendance_dates = date_range(attendance_date, end_date)
+    if summary:
+        require_pandas()
+    tracker = progress.ProgressTracker(callback=progress_callback)
+    if profile:
+        tracker.profiler = ThreadProfiler(profile)
+    started_at = datetime.now().isoformat(timespec='seconds')
+    with progress.bound(tracker):
+        files = _download_attendance(tracker, panchayat_name, panchayat_code, fin_year, work_code, msr_start, msr_end, attendance_dates, digest, max_workers, discover, write_only, image_max_size, image_quality, image_workers, keep_originals, table_format, store_path, parse_workers, summary, max_per_host, fresh)
+    report = None
+    if instrument or profile:
+        run = dict(panchayat_name=panchayat_name, work_code=work_code, msr_start=msr_start, msr_end=msr_end,
+                   attendance_date=attendance_date, end_date=end_date, max_workers=max_workers, discover=discover, write_only=write_only,
+                   image_max_size=image_max_size, image_workers=image_workers, parse_workers=parse_workers,
+                   table_format=table_format, summary=summary, max_per_host=max_per_host, fresh=fresh)
+        report = io.BytesIO(report_json(timing_report(tracker, 'attendance_downloader', run, started_at)).encode('utf-8'))
+    return files + (report,)
+
+
+def _download_attendance(tracker, panchayat_name, panchayat_code, fin_year, work_code, msr_start, msr_end, attendance_dates, digest, max_workers, discover, write_only, image_max_size, image_quality, image_workers, keep_originals, table_format, store_path, parse_workers, summary, max_per_host, fresh):
+    musters = []
     work_name = None
     table_headers = None
-    for msr_no in range(msr_start, msr_end + 1):
-        url_with_workcode = (
-            f"{STARTING_URL}"
-            f"panchayat_name={panchayat_name}&panchayat_code={panchayat_code}"
-            f"&fin_year={fin_year}"
-            f"&source=&work_code={work_code}"
-            f"&msr_no={msr_no}"
-            f"&AttendanceDate={attendance_date}"
-            f"&Digest={digest}"
-        )
-        url_without_workcode = (
-            f"{STARTING_URL}"
-            f"panchayat_name={panchayat_name}&panchayat_code={panchayat_code}"
-            f"&fin_year={fin_year}"
-            f"&source="
-            f"&msr_no={msr_no}"
-            f"&AttendanceDate={attendance_date}"
-            f"&Digest={digest}"
+    multi_date = len(attendance_dates) > 1
+    # Each date keeps its own known-empty set and learned URL form
+    muster_indexes = {d: MusterIndex(panchayat_code, work_code, d, fresh=fresh) for d in attendance_dates}
+    image_store = ImageStore()
+    # image_max_size=None embeds the photos exactly as downloaded
+    image_processor = ImageProcessor(image_max_size, image_quality, image_workers) if image_max_size else None
+    originals = OriginalsArchive() if keep_originals else None
+    # parse_workers > 0 parses in that many processes while max_workers threads fetch
+    page_parser = PageParser(parse_workers) if parse_workers else None
+    get_session(pool_size=max_workers, max_per_host=max_per_host)
+    try:
+        pairs = []
+        for attendance_date in attendance_dates:
+            if discover:
+                msr_numbers = discover_muster_numbers(
+                    panchayat_name, panchayat_code, fin_year, work_code, msr_start, msr_end, attendance_date, digest,
+                    max_workers=max_workers, muster_index=muster_indexes[attendance_date], tracker=tracker, page_parser=page_parser
+                )
+            else:
+                msr_numbers = range(msr_start, msr_end + 1)
+            pairs.extend((attendance_date, msr_no) for msr_no in msr_numbers)
+        tracker.set_total(len(pairs))
+
+        def fetch_pair(pair):
+            attendance_date, msr_no = pair
+            photo_name = f"{attendance_date.replace('/', '-')}/muster_{msr_no}.jpg" if multi_date else None
+            return fetch_muster_roll(msr_no, panchayat_name, panchayat_code, fin_year, work_code, attendance_date, digest, muster_indexes[attendance_date], image_store, image_processor, originals, page_parser, photo_name)
+
+        # Every (date, muster roll) pair goes through one pool sharing the session's
+        # connections; executor.map hands results back in date, then muster roll order
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            results = executor.map(progress.bind(tracker, fetch_pair), pairs)
+            for (attendance_date, _), (msr_no, att_data, photo_url, wname, headers, img_bytes) in zip(pairs, results):
+                if wname and not work_name:
+                    work_name = wname
+                if headers and not table_headers:
+                    table_headers = headers
+                musters.append(MusterRoll(msr_no, att_data, img_bytes, attendance_date))
+                print(f"Muster Roll No. {msr_no} parsed " + (f"({attendance_date})" if multi_date else ''))
+                tracker.advance()
+    finally:
+        # Worker processes are stopped even when a fetch or parse fails
+        if image_processor is not None:
+            image_processor.close()
+        if page_parser is not None:
+            page_parser.close()
+    for attendance_date, muster_index in muster_indexes.items():
+        muster_index.save()
+        tracker.log(f"{attendance_date}: {muster_index.summary()}" if multi_date else muster_index.summary())
+    reused = reused_photos(musters)
+    if reused:
+        tracker.log(f"{len(reused)} muster rolls reuse the photo of another roll: "
+                    + ', '.join(f"{muster.muster_roll_no}{f' ({muster.attendance_date})' if multi_date else ''}: {reuse_note(muster, earlier)}"
+                                for muster, earlier in reused.items()))
+    file_base = f"{work_code}_{attendance_dates[0]}" + (f"_to_{attendance_dates[-1]}" if multi_date else '')
+    file_base = file_base.replace('/', '_')
+
+    try:
+        att_xlsx, img_xlsx, optc_xlsx = export_workbooks(
+            musters, work_code, work_name, panchayat_name, file_base, write_only
         )
-        att_data, photo_url, wname, headers = get_attendance_data(url_with_workcode)
-        if not att_data:
-            att_data, photo_url, wname, headers = get_attendance_data(url_without_workcode)
-        if wname and not work_name:
-            work_name = wname
-        if headers and not table_headers:
-            table_headers = headers
-        if att_data:
-            for row in att_data:
-                attendance_records.append({'muster_roll_no': msr_no, 'row': row})
-        if photo_url:
-            img_bytes = download_photo(photo_url)
-            image_records.append({'muster_roll_no': msr_no, 'image': img_bytes})
-        else:
-            image_records.append({'muster_roll_no': msr_no, 'image': None})
-        option_c_records.append({'muster_roll_no': msr_no, 'attendance': att_data, 'image': img_bytes if photo_url else None})
-        print(f"Muster Roll No. {msr_no} parsed ")
-        if progress_callback:
-            progress_callback(f"Muster Roll {msr_no} parsed ,")
-    file_base = f"{work_code}_{attendance_date}".replace('/', '_')
-
-    att_wb = write_attendance_excel(attendance_records, work_code, work_name, panchayat_name, file_base)
-    img_wb = write_images_excel(image_records, work_code, work_name, panchayat_name, file_base)
-    optc_wb = write_attendance_images_excel(option_c_records, work_code, work_name, panchayat_name, file_base)
-
-    att_xlsx = io.BytesIO()
-    att_wb.save(att_xlsx)
-    att_xlsx.seek(0)
-    img_xlsx = io.BytesIO()
-    img_wb.save(img_xlsx)
-    img_xlsx.seek(0)
-    optc_xlsx = io.BytesIO()
-    optc_wb.save(optc_xlsx)
-    optc_xlsx.seek(0)
-    return att_xlsx, img_xlsx, optc_xlsx, None
+    finally:
+        # Spilled photos are read back from disk by openpyxl while saving
+        image_store.close()
+    originals_zip = originals.close() if originals is not None else None
+    if store_path:
+        ingest_rows(attendance_table_rows(musters, work_code, panchayat_name), store_path)
+    # The table is one combined export; its Attendance Date column tells the dates apart
+    table = export_table(musters, work_code, panchayat_name, table_format) if table_format else None
+    summary_xlsx = None
+    if summary:
+        summary_xlsx = io.BytesIO()
+        write_summary_excel(summarize(attendance_table_rows(musters, work_code, panchayat_name)), summary_xlsx, write_only)
+        summary_xlsx.seek(0)
+    tracker.finish(tracker.summary())
+    return att_xlsx, img_xlsx, optc_xlsx, originals_zip, table, summary_xlsx
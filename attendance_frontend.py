@@ -1,16 +1,30 @@
+import os
+import time
 import streamlit as st
 from datetime import date
-from attendance_downloader import run_attendance_downloader
+from attendance_analytics import pandas_available
+from attendance_downloader import MAX_DATE_RANGE_DAYS, run_attendance_downloader
+from attendance_store import DB_PATH
+from image_processing import IMAGE_MAX_SIZE, JPEG_QUALITY
+from instrumentation import pyinstrument
+from job_runner import DONE, FAILED, MAX_CONCURRENT_JOBS, MAX_FINISHED_JOBS, JobRunner
+from table_export import TABLE_FORMATS
 
 st.title('Attendance Downloader')
 
-# Session state for reset and file tracking
-if 'submitted' not in st.session_state:
-    st.session_state['submitted'] = False
-if 'files' not in st.session_state:
-    st.session_state['files'] = None
-if 'progress_msgs' not in st.session_state:
-    st.session_state['progress_msgs'] = []
+POLL_SECONDS = 1
+
+# One runner per server process, shared by every browser session, so the job cap
+# applies across operators and jobs survive a closed tab
+@st.cache_resource
+def get_job_runner():
+    return JobRunner(MAX_CONCURRENT_JOBS)
+
+job_runner = get_job_runner()
+
+# Session state: IDs of the jobs this session is following
+if 'job_ids' not in st.session_state:
+    st.session_state['job_ids'] = []
 
 # User input fields
 panchayat_name = st.text_input('Panchayath Name (e.g., BALAKUNDHI)', key='panchayat_name')
@@ -19,18 +33,66 @@ fin_year = st.text_input('Financial Year (e.g., 2024-2025)', value='2024-2025',
 work_code = st.text_input('Work Code', key='work_code')
 msr_start = st.number_input('Muster Roll Start Number', min_value=1, step=1, key='msr_start')
 msr_end = st.number_input('Muster Roll End Number', min_value=1, step=1, key='msr_end')
-attendance_date = st.date_input('Attendance Date', value=date.today(), key='attendance_date')
+date_range_mode = st.checkbox(f'Download a range of attendance dates (up to {MAX_DATE_RANGE_DAYS} days, one sheet per date)', key='date_range_mode')
+if date_range_mode:
+    attendance_dates = st.date_input('Attendance Dates (start - end)', value=(date.today(), date.today()), key='attendance_dates')
+else:
+    attendance_dates = (st.date_input('Attendance Date', value=date.today(), key='attendance_date'),)
 digest = st.text_input('Digest', key='digest')
+discover = st.checkbox('Auto-discover muster rolls in range (probe sparsely, fetch only populated rolls)', key='discover')
+recheck_empty = st.checkbox('Re-check muster rolls earlier runs found empty', key='recheck_empty')
+write_only = st.checkbox('Low-memory export (stream workbooks to disk, for very large ranges)', key='write_only')
+full_res_images = st.checkbox('Embed photos at full resolution (larger, slower workbooks)', key='full_res_images')
+image_quality = st.slider('Photo JPEG Quality', min_value=30, max_value=95, value=JPEG_QUALITY, key='image_quality')
+keep_originals = st.checkbox('Also download original photos as a zip', key='keep_originals')
+table_format = st.selectbox('Also export attendance rows as', ['None'] + [fmt.upper() for fmt in TABLE_FORMATS], key='table_format')
+has_pandas = pandas_available()
+summary = st.checkbox('Also download summary sheets (presence, person-days, gender split, absentee streaks)', key='summary',
+                      disabled=not has_pandas, help=None if has_pandas else 'Needs pandas on the server')
+store_rows = st.checkbox('Save attendance rows to the local database (query later with attendance_store.py)', key='store_rows')
+max_workers = st.number_input('Parallel Downloads', min_value=1, max_value=32, value=8, step=1, key='max_workers')
+instrument = st.checkbox('Write a timing report (per-stage times and counters, JSON)', key='instrument')
+profilers = ['None', 'cProfile'] + (['pyinstrument'] if pyinstrument is not None else [])
+profile = st.selectbox('Profile the run (hottest functions in the timing report)', profilers, key='profile', disabled=not instrument)
 
-# Progress area
-progress_area = st.empty()
+def download_job(file_base, table_ext, progress_callback=None, result_dir=None, **kwargs):
+    files = run_attendance_downloader(progress_callback=progress_callback, **kwargs)
+    # The runner keeps finished jobs around; their files wait on disk, not in memory
+    paths = []
+    for index, f in enumerate(files):
+        path = None
+        if f is not None:
+            path = os.path.join(result_dir, str(index))
+            with open(path, 'wb') as out:
+                out.write(f.getbuffer())
+        paths.append(path)
+    return file_base, table_ext, paths
 
-# Progress callback for backend
-progress_msgs = st.session_state.get('progress_msgs', [])
-def progress_callback(msg):
-    progress_msgs.append(msg)
-    st.session_state['progress_msgs'] = progress_msgs
-    progress_area.write('\n'.join(progress_msgs))
+def read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+def format_seconds(seconds):
+    if seconds is None:
+        return '-'
+    minutes, secs = divmod(int(seconds), 60)
+    return f'{minutes}m {secs:02d}s' if minutes else f'{secs}s'
+
+def show_progress(snap):
+    # Fixed number of widgets per update, however many muster rolls the job has
+    total = snap['total']
+    done = snap['completed']
+    st.progress(min(1.0, done / total) if total else 0.0, text=f'{done} / {total or "?"} muster rolls')
+    cols = st.columns(4)
+    cols[0].metric('Rolls / s', f"{snap['rate']:.2f}")
+    cols[1].metric('ETA', format_seconds(snap['eta']))
+    cols[2].metric('Requests', snap['requests'], help=f"{snap['retries']} retries")
+    cols[3].metric('Downloaded', f"{snap['bytes'] / 1048576:.1f} MB", help=f"{snap['cache_hits']} cache hits")
+    phases = ' · '.join(f'{name} {seconds:.1f}s' for name, seconds in snap['phase_seconds'].items() if seconds)
+    st.caption(f"Elapsed {format_seconds(snap['elapsed'])} · {snap['cache_hits']} cache hits · {snap['retries']} retries · "
+               f"{snap['fetch_errors']} failed fetches · {phases}")
+    if snap['message']:
+        st.text(snap['message'])
 
 # Download button and status
 download_btn_col, status_col = st.columns([2, 1])
@@ -52,49 +114,89 @@ if download_clicked:
         errors.append('Digest is required.')
     if msr_start > msr_end:
         errors.append('Muster Roll Start Number must be less than or equal to End Number.')
+    if date_range_mode and len(attendance_dates) != 2:
+        errors.append('Pick both a start and an end date.')
+    elif (attendance_dates[-1] - attendance_dates[0]).days >= MAX_DATE_RANGE_DAYS:
+        errors.append(f'A date range may span at most {MAX_DATE_RANGE_DAYS} days.')
     if errors:
         for err in errors:
             st.error(err)
     else:
-        st.session_state['submitted'] = True
-        st.session_state['progress_msgs'] = []
-        att_date_str = attendance_date.strftime('%d/%m/%Y')
+        att_date_str = attendance_dates[0].strftime('%d/%m/%Y')
+        end_date_str = attendance_dates[-1].strftime('%d/%m/%Y') if attendance_dates[-1] != attendance_dates[0] else None
+        date_label = f"{att_date_str} to {end_date_str}" if end_date_str else att_date_str
         if not panchayat_code.startswith('1505007'):
             panchayat_code_full = '1505007' + panchayat_code
         else:
             panchayat_code_full = panchayat_code
-        st.info('Running backend process...')
-        try:
-            files = run_attendance_downloader(
-                panchayat_name, panchayat_code_full, fin_year, work_code, int(msr_start), int(msr_end), att_date_str, digest,
-                progress_callback=progress_callback
-            )
-            st.session_state['files'] = files
-        except Exception as e:
-            st.error(f'Error during processing: {e}')
-
-# Show progress messages
-if st.session_state.get('progress_msgs'):
-    progress_area.write('\n'.join(st.session_state['progress_msgs']))
-
-# Show download buttons if files exist
-files = st.session_state.get('files')
-if files:
-    att_date_str = attendance_date.strftime('%d/%m/%Y')
-    file_base = f"{work_code}_{att_date_str}".replace('/', '_')
-    file_labels = [
-        (files[0], f'attendance_data_{file_base}.xlsx', 'Attendance Data Excel'),
-        (files[1], f'attendance_images_{file_base}.xlsx', 'Images Excel'),
-        (files[2], f'attendance_with_images_{file_base}.xlsx', 'Attendance+Images Excel'),
-        # (files[3], f'attendance_with_images_{file_base}.pdf', 'PDF Report'),  # PDF download button commented out
-    ]
-    for file_obj, fname, label in file_labels:
-        if file_obj is not None:
-            st.download_button(f'Download {label}', file_obj, file_name=fname, key=fname)
-    with status_col:
-        st.success('✔️ Parsing complete! Files are ready for download.')
-    # Reset button below download buttons
-    if st.button('Reset App'):
-        for key in list(st.session_state.keys()):
-            del st.session_state[key]
-        st.rerun() 
\ No newline at end of file
+        file_base = f"{work_code}_{att_date_str}" + (f"_to_{end_date_str}" if end_date_str else '')
+        file_base = file_base.replace('/', '_')
+        table_ext = None if table_format == 'None' else table_format.lower()
+        job_id = job_runner.submit(
+            download_job, file_base, table_ext,
+            label=f"{panchayat_name} {work_code} {date_label} (MR {int(msr_start)}-{int(msr_end)})",
+            panchayat_name=panchayat_name, panchayat_code=panchayat_code_full, fin_year=fin_year, work_code=work_code,
+            msr_start=int(msr_start), msr_end=int(msr_end), attendance_date=att_date_str, end_date=end_date_str, digest=digest,
+            max_workers=int(max_workers), discover=discover, fresh=recheck_empty, write_only=write_only,
+            image_max_size=None if full_res_images else IMAGE_MAX_SIZE, image_quality=int(image_quality),
+            keep_originals=keep_originals, table_format=table_ext, summary=summary,
+            store_path=DB_PATH if store_rows else None,
+            instrument=instrument, profile=profile.lower() if instrument and profile != 'None' else None
+        )
+        st.session_state['job_ids'].append(job_id)
+        with status_col:
+            st.success(f'Job {job_id} submitted')
+
+# A job keeps running when the tab is closed; its ID brings it back
+lookup_id = st.text_input('Open an earlier job by ID', key='lookup_id').strip()
+if lookup_id and lookup_id not in st.session_state['job_ids']:
+    if job_runner.get(lookup_id):
+        st.session_state['job_ids'].append(lookup_id)
+    else:
+        st.warning(f'No job {lookup_id} on this server (finished jobs are kept for the last {MAX_FINISHED_JOBS}).')
+
+st.caption(f'{job_runner.active_count()} of {job_runner.max_concurrent} job slots busy, {job_runner.queued_count()} queued')
+
+# Jobs of this session, newest first
+pending = False
+for job_id in reversed(st.session_state['job_ids']):
+    job = job_runner.get(job_id)
+    if job is None:
+        st.warning(f'Job {job_id} is no longer available.')
+        continue
+    pending = pending or not job.finished
+    with st.expander(f'Job {job.id}: {job.label} ({job.status}, {job.elapsed:.0f}s)', expanded=not job.finished or job.status == DONE):
+        if job.status == DONE:
+            file_base, table_ext, files = job.result
+            file_labels = [
+                (files[0], f'attendance_data_{file_base}.xlsx', 'Attendance Data Excel'),
+                (files[1], f'attendance_images_{file_base}.xlsx', 'Images Excel'),
+                (files[2], f'attendance_with_images_{file_base}.xlsx', 'Attendance+Images Excel'),
+                (files[3], f'original_photos_{file_base}.zip', 'Original Photos Zip'),
+            ]
+            if files[4] is not None:
+                file_labels.append((files[4], f'attendance_rows_{file_base}.{table_ext}', f'Attendance Rows {table_ext.upper()}'))
+            file_labels.append((files[5], f'attendance_summary_{file_base}.xlsx', 'Summary Excel'))
+            file_labels.append((files[6], f'timing_report_{file_base}.json', 'Timing Report JSON'))
+            for path, fname, label in file_labels:
+                if path is not None:
+                    st.download_button(f'Download {label}', read_file(path), file_name=fname, key=f'{job.id}_{fname}')
+            st.success('✔️ Parsing complete! Files are ready for download.')
+        elif job.status == FAILED:
+            st.error(f'Error during processing: {job.error}')
+            st.text('\n'.join(job.recent_messages(3)))
+        elif job.progress is None:
+            st.text('Waiting for a free job slot...')
+        else:
+            show_progress(job.progress)
+
+# Reset button below the jobs; running jobs carry on and stay reachable by ID
+if st.session_state['job_ids'] and st.button('Reset App'):
+    for key in list(st.session_state.keys()):
+        del st.session_state[key]
+    st.rerun()
+
+# Poll while any followed job is still queued or running
+if pending:
+    time.sleep(POLL_SECONDS)
+    st.rerun()
@@ -0,0 +1,260 @@
+import argparse
+import os
+import sqlite3
+import threading
+
+from attendance_analytics import save_summary_excel
+from table_export import parse_date
+
+# Local SQLite store of every attendance row downloaded so far, so questions across
+# runs ("days job card X was present this month") are one indexed query instead of
+# opening a pile of workbooks. Rows are the normalized table_export rows.
+DB_PATH = os.environ.get('NREGA_DB', 'nrega_attendance.sqlite3')
+INSERT_BATCH_ROWS = 5000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS attendance (
+    taluk TEXT,
+    panchayath TEXT,
+    work_code TEXT,
+    muster_roll_no TEXT,
+    job_card_no TEXT,
+    worker_name TEXT,
+    gender TEXT,
+    attendance TEXT,
+    attendance_date TEXT,   -- ISO yyyy-mm-dd, so ranges compare as text
+    attendance_time TEXT    -- value as shown on the portal
+);
+CREATE UNIQUE INDEX IF NOT EXISTS attendance_row_key
+    ON attendance (work_code, muster_roll_no, job_card_no, worker_name, attendance_date);
+CREATE INDEX IF NOT EXISTS attendance_job_card ON attendance (job_card_no, attendance_date);
+CREATE INDEX IF NOT EXISTS attendance_muster_roll ON attendance (muster_roll_no);
+CREATE INDEX IF NOT EXISTS attendance_work_code ON attendance (work_code);
+CREATE INDEX IF NOT EXISTS attendance_panchayath ON attendance (panchayath, attendance_date);
+CREATE INDEX IF NOT EXISTS attendance_date ON attendance (attendance_date);
+-- Muster rolls already fetched by a sync, listed date and Panchayath as on the portal
+CREATE TABLE IF NOT EXISTS synced_musters (
+    attendance_date TEXT,
+    panchayath TEXT,
+    work_code TEXT,
+    muster_roll_no TEXT,
+    row_count INTEGER,
+    synced_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (attendance_date, panchayath, work_code, muster_roll_no)
+);
+"""
+
+# A rerun of the same muster roll updates the attendance mark instead of duplicating rows
+INSERT_SQL = """
+INSERT INTO attendance VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (work_code, muster_roll_no, job_card_no, worker_name, attendance_date)
+DO UPDATE SET attendance = excluded.attendance, attendance_time = excluded.attendance_time
+"""
+ROW_COLUMNS = ("panchayath, work_code, muster_roll_no, job_card_no, worker_name, gender, "
+               "attendance, attendance_date")
+SYNCED_SQL = """
+INSERT OR REPLACE INTO synced_musters (attendance_date, panchayath, work_code, muster_roll_no, row_count)
+VALUES (?, ?, ?, ?, ?)
+"""
+PRESENT = "attendance LIKE 'P%'"
+
+
+def iso_date(value):
+    parsed = parse_date(value)
+    return parsed.isoformat() if parsed else None
+
+
+def date_range_clause(start, end):
+    clauses, params = [], []
+    for value, clause in ((start, "attendance_date >= ?"), (end, "attendance_date <= ?")):
+        if not value:
+            continue
+        # A bound that does not parse would compare against NULL and match nothing
+        day = iso_date(value)
+        if day is None:
+            raise ValueError(f"Invalid date {value!r}, expected dd/mm/yyyy")
+        clauses.append(clause)
+        params.append(day)
+    return ''.join(f" AND {clause}" for clause in clauses), params
+
+
+class AttendanceStore:
+    def __init__(self, path=None):
+        self.path = path or DB_PATH
+        # Batch mode ingests from several panchayath threads at once
+        self.conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock:
+            self.conn.executescript(SCHEMA)
+
+    def ingest(self, rows, batch_rows=INSERT_BATCH_ROWS):
+        # rows are table_export.ATTENDANCE_HEADER ordered lists; one transaction per batch
+        count = 0
+        batch = []
+        for row in rows:
+            batch.append(self._db_row(row))
+            if len(batch) >= batch_rows:
+                count += self._insert(batch)
+                batch = []
+        if batch:
+            count += self._insert(batch)
+        return count
+
+    @staticmethod
+    def _db_row(row):
+        # Attendance Date is last: store it as ISO plus the portal's original text
+        return tuple(row[:-1]) + (iso_date(row[-1]), row[-1])
+
+    def _insert(self, batch):
+        with self.lock, self.conn:
+            self.conn.executemany(INSERT_SQL, batch)
+        return len(batch)
+
+    def synced_musters(self, attendance_date, panchayath):
+        return set(self.query(
+            "SELECT work_code, muster_roll_no FROM synced_musters WHERE attendance_date = ? AND panchayath = ?",
+            (attendance_date, panchayath),
+        ))
+
+    def stored_musters(self, attendance_date, panchayath):
+        # (work_code, muster_roll_no) of rows already stored for this date, by any run
+        return set(self.query(
+            "SELECT DISTINCT work_code, muster_roll_no FROM attendance WHERE attendance_date = ? AND panchayath = ?",
+            (iso_date(attendance_date), panchayath),
+        ))
+
+    def record_sync(self, attendance_date, panchayath, rows, musters):
+        # Rows and the muster rolls they came from commit together, so an interrupted
+        # sync never marks a roll as done without its rows
+        with self.lock, self.conn:
+            self.conn.executemany(INSERT_SQL, [self._db_row(row) for row in rows])
+            self.conn.executemany(SYNCED_SQL, [
+                (attendance_date, panchayath, work_code, muster_roll_no, row_count)
+                for work_code, muster_roll_no, row_count in musters
+            ])
+
+    def query(self, sql, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def days_present(self, job_card_no, start=None, end=None):
+        dates, params = date_range_clause(start, end)
+        return self.query(
+            f"SELECT COUNT(DISTINCT attendance_date) FROM attendance WHERE job_card_no = ? AND {PRESENT}{dates}",
+            [job_card_no] + params,
+        )[0][0]
+
+    def job_card_history(self, job_card_no, start=None, end=None):
+        dates, params = date_range_clause(start, end)
+        return self.query(
+            f"SELECT {ROW_COLUMNS} FROM attendance WHERE job_card_no = ?{dates} ORDER BY attendance_date, worker_name",
+            [job_card_no] + params,
+        )
+
+    def muster_roll(self, muster_roll_no, work_code=None):
+        work, params = ("AND work_code = ?", [work_code]) if work_code else ('', [])
+        return self.query(
+            f"SELECT {ROW_COLUMNS} FROM attendance WHERE muster_roll_no = ? {work} ORDER BY attendance_date, job_card_no",
+            [muster_roll_no] + params,
+        )
+
+    def work_summary(self, work_code, start=None, end=None):
+        dates, params = date_range_clause(start, end)
+        return self.query(
+            f"SELECT attendance_date, COUNT(*), SUM({PRESENT}) FROM attendance "
+            f"WHERE work_code = ?{dates} GROUP BY attendance_date ORDER BY attendance_date",
+            [work_code] + params,
+        )
+
+    def panchayath_summary(self, panchayath, start=None, end=None):
+        dates, params = date_range_clause(start, end)
+        return self.query(
+            f"SELECT attendance_date, COUNT(DISTINCT muster_roll_no), COUNT(*), SUM({PRESENT}) FROM attendance "
+            f"WHERE panchayath = ?{dates} GROUP BY attendance_date ORDER BY attendance_date",
+            [panchayath] + params,
+        )
+
+    def attendance_rows(self, start=None, end=None, panchayath=None, work_code=None):
+        # Stored rows in table_export order (the portal's date text last), for summaries
+        dates, params = date_range_clause(start, end)
+        filters = ''
+        for column, value in (('panchayath', panchayath), ('work_code', work_code)):
+            if value:
+                filters += f" AND {column} = ?"
+                params.append(value)
+        return self.query(
+            "SELECT taluk, panchayath, work_code, muster_roll_no, job_card_no, worker_name, gender, attendance, "
+            f"attendance_time FROM attendance WHERE 1 = 1{dates}{filters} ORDER BY attendance_date",
+            params,
+        )
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def ingest_rows(rows, path=None):
+    with AttendanceStore(path) as store:
+        count = store.ingest(rows)
+    print(f"Stored {count} attendance rows in {store.path}")
+    return count
+
+
+def print_rows(header, rows):
+    print('\t'.join(header))
+    for row in rows:
+        print('\t'.join('' if value is None else str(value) for value in row))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the local attendance database")
+    parser.add_argument('--db', default=DB_PATH, help="database file (default %(default)s, or $NREGA_DB)")
+    commands = parser.add_subparsers(dest='command', required=True)
+    for name, target, help_text in [
+        ('days-present', 'job_card', "number of days a job card was marked present"),
+        ('history', 'job_card', "every attendance row of a job card"),
+        ('muster', 'muster_roll_no', "every attendance row of a muster roll"),
+        ('work', 'work_code', "workers and present count per day for a work code"),
+        ('panchayath', 'panchayath', "muster rolls, workers and present count per day for a Panchayath"),
+        ('summary', 'xlsx', "summary sheets over the stored rows: presence, person-days, gender split, absentee streaks"),
+    ]:
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument(target)
+        if name == 'muster':
+            command.add_argument('--work-code')
+        else:
+            command.add_argument('--from', dest='start', help="first date, dd/mm/yyyy")
+            command.add_argument('--to', dest='end', help="last date, dd/mm/yyyy")
+        if name == 'summary':
+            command.add_argument('--panchayath')
+            command.add_argument('--work-code')
+    args = parser.parse_args()
+    for flag, value in (('--from', getattr(args, 'start', None)), ('--to', getattr(args, 'end', None))):
+        if value and iso_date(value) is None:
+            parser.error(f"{flag}: invalid date {value!r}, expected dd/mm/yyyy")
+
+    row_header = ROW_COLUMNS.split(', ')
+    with AttendanceStore(args.db) as store:
+        if args.command == 'days-present':
+            print(store.days_present(args.job_card, args.start, args.end))
+        elif args.command == 'history':
+            print_rows(row_header, store.job_card_history(args.job_card, args.start, args.end))
+        elif args.command == 'muster':
+            print_rows(row_header, store.muster_roll(args.muster_roll_no, args.work_code))
+        elif args.command == 'summary':
+            rows = store.attendance_rows(args.start, args.end, args.panchayath and args.panchayath.upper(), args.work_code)
+            save_summary_excel(rows, args.xlsx)
+        elif args.command == 'work':
+            print_rows(['attendance_date', 'workers', 'present'], store.work_summary(args.work_code, args.start, args.end))
+        else:
+            print_rows(['attendance_date', 'muster_rolls', 'workers', 'present'],
+                       store.panchayath_summary(args.panchayath.upper(), args.start, args.end))
+
+
+if __name__ == '__main__':
+    main()
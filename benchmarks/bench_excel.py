@@ -0,0 +1,68 @@
+import argparse
+import io
+import os
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def make_records(rows, workers_per_roll, with_images, shrink_images=False):
+    from sample_pages import make_photo
+    photo = make_photo(0) if with_images else None
+    if photo and shrink_images:
+        from image_processing import shrink_image
+        photo = shrink_image(photo)
+    from attendance_downloader import MusterRoll
+    from muster_parser import make_record
+    musters = []
+    for msr_no in range(1, rows // workers_per_roll + 1):
+        att_rows = [make_record(str(i), f'KN-05-007-016-{msr_no:05d}/{i:03d}', f'WORKER {msr_no}-{i} (M)', '03/07/2025 10:00:00 AM', 'Present')
+                    for i in range(1, workers_per_roll + 1)]
+        musters.append(MusterRoll(msr_no, att_rows, io.BytesIO(photo) if photo else None))
+    return musters
+
+
+def run_export(write_only, rows, workers_per_roll, with_images, shrink_images=False):
+    from attendance_downloader import write_attendance_excel, write_attendance_images_excel, write_images_excel
+    musters = make_records(rows, workers_per_roll, with_images, shrink_images)
+    start = time.perf_counter()
+    sizes = []
+    for writer in (write_attendance_excel, write_images_excel, write_attendance_images_excel):
+        wb = writer(musters, 'WC/1', 'Bench work', 'BALAKUNDHI', 'bench', write_only)
+        out = io.BytesIO()
+        wb.save(out)
+        sizes.append(out.tell())
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is KiB on Linux
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{'write-only' if write_only else 'in-memory':10s}  {elapsed:7.2f} s  peak RSS {peak_mb:8.1f} MB  xlsx {sum(sizes) / 1e6:6.2f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Peak memory and time for the attendance Excel exports')
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--workers-per-roll', type=int, default=40)
+    parser.add_argument('--images', action='store_true', help='attach a photo to every muster roll')
+    parser.add_argument('--shrink-images', action='store_true', help='resize/recompress photos before embedding')
+    parser.add_argument('--mode', choices=['in-memory', 'write-only'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.mode:
+        run_export(args.mode == 'write-only', args.rows, args.workers_per_roll, args.images, args.shrink_images)
+        return
+    print(f"{args.rows} attendance rows, {args.rows // args.workers_per_roll} muster rolls, "
+          f"images: {args.images}, shrunk: {args.shrink_images}")
+    # Each mode runs in a fresh process so peak RSS is not shared between them
+    for mode in ('in-memory', 'write-only'):
+        cmd = [sys.executable, __file__, '--mode', mode, '--rows', str(args.rows), '--workers-per-roll', str(args.workers_per_roll)]
+        if args.images:
+            cmd.append('--images')
+        if args.shrink_images:
+            cmd.append('--shrink-images')
+        subprocess.run(cmd, check=True, stdout=sys.stdout)
+
+
+if __name__ == '__main__':
+    main()
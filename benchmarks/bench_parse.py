@@ -0,0 +1,43 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from muster_parser import BACKENDS, parse_muster_page
+from sample_pages import load_pages
+
+
+def bench_backend(backend, pages, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for page in pages:
+            parse_muster_page(page, backend)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(pages)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-page parse time for each muster page parser backend')
+    parser.add_argument('--pages', help='directory of recorded muster pages (*.html); synthetic pages otherwise')
+    parser.add_argument('--count', type=int, default=50, help='number of synthetic pages')
+    parser.add_argument('--workers', type=int, default=40, help='worker rows per synthetic page')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    pages = load_pages(args.pages, args.count, args.workers)
+    reference = [parse_muster_page(page, 'html.parser') for page in pages]
+    print(f"{len(pages)} pages, backends: {', '.join(BACKENDS)}")
+    baseline = None
+    for backend in BACKENDS:
+        same = all(parse_muster_page(page, backend) == ref for page, ref in zip(pages, reference))
+        per_page = bench_backend(backend, pages, args.repeat)
+        baseline = baseline or per_page
+        print(f"{backend:12s} {per_page * 1000:8.2f} ms/page  x{baseline / per_page:5.1f}  identical output: {same}")
+
+
+if __name__ == '__main__':
+    main()
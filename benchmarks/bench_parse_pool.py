@@ -0,0 +1,75 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from muster_parser import BACKENDS, DEFAULT_BACKEND, PageParser, parse_muster_page
+from sample_pages import load_pages
+
+# Pages are handed to the parser by a pool of threads, as the download workers do.
+# With 0 processes the threads parse themselves and share one core through the GIL.
+
+
+def process_counts(max_procs):
+    counts = [0]
+    n = 1
+    while n < max_procs:
+        counts.append(n)
+        n *= 2
+    counts.append(max_procs)
+    return counts
+
+
+def normalized(result):
+    attendance_data, photo_url, work_name, header_cells = result
+    return ([list(row) for row in attendance_data] if attendance_data is not None else None,
+            photo_url, work_name, list(header_cells) if header_cells is not None else None)
+
+
+def bench(pages, threads, processes, backend, repeat):
+    page_parser = PageParser(processes, backend)
+    try:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            # Start the worker processes before timing
+            list(executor.map(page_parser, pages[:max(1, processes)]))
+            best = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                results = list(executor.map(page_parser, pages))
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+    finally:
+        page_parser.close()
+    return best, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Muster page parse throughput with 1..N parse processes')
+    parser.add_argument('--pages', help='directory of recorded muster pages (*.html); synthetic pages otherwise')
+    parser.add_argument('--count', type=int, default=200, help='number of synthetic pages')
+    parser.add_argument('--workers', type=int, default=40, help='worker rows per synthetic page')
+    parser.add_argument('--threads', type=int, default=8, help='download threads handing pages to the parser')
+    parser.add_argument('--max-procs', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--backend', choices=list(BACKENDS), default=DEFAULT_BACKEND)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    pages = load_pages(args.pages, args.count, args.workers)
+    reference = [normalized(parse_muster_page(page, args.backend)) for page in pages]
+    print(f"{len(pages)} pages, {args.backend}, {args.threads} threads, {os.cpu_count()} CPUs")
+    print(f"{'processes':>9s} {'pages/s':>9s} {'speedup':>8s}  identical output")
+    baseline = None
+    for processes in process_counts(args.max_procs):
+        elapsed, results = bench(pages, args.threads, processes, args.backend, args.repeat)
+        rate = len(pages) / elapsed
+        baseline = baseline or rate
+        same = [normalized(result) for result in results] == reference
+        label = str(processes) if processes else 'threads'
+        print(f"{label:>9s} {rate:9.1f} {rate / baseline:7.2f}x  {same}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from portal_server import PortalConfig, PortalServer
+
+# End-to-end runs of both pipelines against the local portal stand-in. Every case
+# runs in a fresh process (own peak RSS, cold HTTP cache); the server stays in
+# this process so it does not compete with the measured pipeline for the GIL.
+PIPELINES = ('downloader', 'attend_2way')
+
+
+class StageTimer:
+    # Wraps a function and sums its wall time across threads
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.seconds = 0.0
+        self.calls = 0
+
+    def wrap(self, fn):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self.lock:
+                    self.seconds += time.perf_counter() - start
+                    self.calls += 1
+        return timed
+
+
+def configure_client(rate_limit, backoff):
+    import http_client
+    if rate_limit:
+        http_client._rate_limiter = http_client.TokenBucket(rate_limit, max(1, rate_limit))
+    else:
+        http_client._rate_limiter = http_client.TokenBucket(float('inf'), float('inf'))
+    # Injected 503s are retried with this backoff; the live default would dominate short runs
+    http_client.BACKOFF_FACTOR = backoff
+
+
+def run_case(args):
+    import attendance_downloader
+    import excel_media
+    import openpyxl
+    configure_client(args.rate_limit, args.backoff)
+    parse_timer = StageTimer()
+    save_timer = StageTimer()
+    attendance_downloader.parse_muster_page = parse_timer.wrap(attendance_downloader.parse_muster_page)
+    openpyxl.Workbook.save = save_timer.wrap(openpyxl.Workbook.save)
+    # Workbooks with photos are saved through excel_media (attend_2way imports it later)
+    excel_media.save_workbook = save_timer.wrap(excel_media.save_workbook)
+    attendance_downloader.save_workbook = excel_media.save_workbook
+    snapshots = []
+    out = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(out):
+        if args.pipeline == 'downloader':
+            attendance_downloader.STARTING_URL = args.url
+            attendance_downloader.run_attendance_downloader(
+                'BALAKUNDHI', '1505007016', '2024-2025', '1505007016/IF/1', 1, args.size, args.date, 'bench',
+                progress_callback=snapshots.append, max_workers=args.workers,
+            )
+        else:
+            import attend_2way
+            import progress
+            attend_2way.BASE_URL = args.url
+            # Bound here, attend_2way's stage hooks report into this tracker like an --instrument run
+            tracker = progress.ProgressTracker(callback=snapshots.append)
+            with progress.bound(tracker):
+                attend_2way.main(panchayaths=[args.panchayath], dates=[args.date], fresh=True, workers=args.workers)
+            tracker.finish()
+    wall = time.perf_counter() - start
+    excel = snapshots[-1]['phase_seconds']['excel'] if snapshots else None
+    print(json.dumps({
+        'wall': wall,
+        'pages_parsed': parse_timer.calls,
+        'parse_seconds': parse_timer.seconds,
+        'excel_seconds': excel,
+        'save_seconds': save_timer.seconds,
+        # ru_maxrss is KiB on Linux
+        'peak_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }))
+
+
+def fmt(value, spec, missing='-'):
+    return missing if value is None else format(value, spec)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end time, request rate, parse/Excel time and peak memory of both pipelines, offline')
+    parser.add_argument('--pipelines', default=','.join(PIPELINES), help='comma separated: downloader, attend_2way')
+    parser.add_argument('--sizes', default='10,50,200', help='muster rolls per run, comma separated')
+    parser.add_argument('--latency', type=float, default=0.05, help='server delay per response, seconds')
+    parser.add_argument('--jitter', type=float, default=0.05)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of 503 responses')
+    parser.add_argument('--workers-per-roll', type=int, default=20)
+    parser.add_argument('--pages', help='directory of recorded muster pages (*.html); synthetic pages otherwise')
+    parser.add_argument('--workers', type=int, default=8, help='fetch workers in the pipeline')
+    parser.add_argument('--rate-limit', type=float, default=0, help='client requests/s (0 = unlimited; the live default is 10)')
+    parser.add_argument('--backoff', type=float, default=0.05, help='client retry backoff factor')
+    parser.add_argument('--json', help='also write the results to this file')
+    # Internal: one measured case, run in a child process
+    parser.add_argument('--case', choices=PIPELINES, help=argparse.SUPPRESS)
+    parser.add_argument('--url', help=argparse.SUPPRESS)
+    parser.add_argument('--size', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--date', default='03/07/2025', help=argparse.SUPPRESS)
+    parser.add_argument('--panchayath', default='BALAKUNDHI', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.case:
+        args.pipeline = args.case
+        run_case(args)
+        return
+
+    config = PortalConfig(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                          workers_per_roll=args.workers_per_roll, pages_dir=args.pages)
+    server = PortalServer(config).start()
+    print(f"latency {args.latency}+{args.jitter}s, error rate {args.error_rate}, {args.workers} workers, "
+          f"rate limit {args.rate_limit or 'off'}")
+    print(f"{'pipeline':12s} {'rolls':>5s} {'wall s':>8s} {'requests':>8s} {'req/s':>7s} {'errors':>6s} "
+          f"{'parse ms/pg':>11s} {'excel s':>8s} {'save s':>7s} {'peak MB':>8s}")
+    results = []
+    try:
+        for pipeline in args.pipelines.split(','):
+            for size in (int(s) for s in args.sizes.split(',')):
+                config.rolls_per_panchayath = size
+                url = server.muster_url if pipeline == 'downloader' else server.form_url
+                server.stats.reset()
+                with tempfile.TemporaryDirectory() as tmp:
+                    # Cold cache, and attend_2way's files and journals land in the temp dir
+                    env = dict(os.environ, NREGA_CACHE='0', NREGA_CACHE_DIR=os.path.join(tmp, 'cache'))
+                    cmd = [sys.executable, os.path.abspath(__file__), '--case', pipeline, '--url', url, '--size', str(size),
+                           '--workers', str(args.workers), '--rate-limit', str(args.rate_limit), '--backoff', str(args.backoff)]
+                    proc = subprocess.run(cmd, cwd=tmp, env=env, capture_output=True, text=True)
+                if proc.returncode != 0:
+                    print(f"{pipeline:12s} {size:5d} failed:\n{proc.stderr}")
+                    continue
+                result = json.loads(proc.stdout.strip().splitlines()[-1])
+                result.update(pipeline=pipeline, size=size, server=server.stats.as_dict())
+                results.append(result)
+                requests = result['server']['requests']
+                per_page = result['parse_seconds'] / result['pages_parsed'] * 1000 if result['pages_parsed'] else None
+                print(f"{pipeline:12s} {size:5d} {result['wall']:8.2f} {requests:8d} {requests / result['wall']:7.1f} "
+                      f"{result['server']['errors']:6d} {fmt(per_page, '11.2f'):>11s} {fmt(result['excel_seconds'], '8.2f'):>8s} "
+                      f"{result['save_seconds']:7.2f} {result['peak_mb']:8.1f}")
+    finally:
+        server.stop()
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
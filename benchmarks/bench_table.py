@@ -0,0 +1,74 @@
+import argparse
+import csv
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import openpyxl
+from attendance_downloader import new_workbook
+from table_export import ATTENDANCE_HEADER, TABLE_FORMATS, attendance_row, pq, write_table
+
+
+def make_rows(count):
+    # About a month of one panchayath: 30 workers per roll, 20 rolls per work
+    for i in range(count):
+        att_row = [str(i % 30 + 1), f"KN-05-007-016-{i % 900:03d}/{i % 7}", f"Worker {i % 900} ({'M' if i % 2 else 'F'})",
+                   f"{i % 28 + 1:02d}/07/2025", 'Present' if i % 5 else 'Absent']
+        yield attendance_row('Siruguppa', f"PANCHAYATH{i % 3}", f"1505007016/IF/{i // 6000}", str(i // 30 % 20 + 1), att_row)
+
+
+def write_xlsx(rows, path):
+    wb, ws = new_workbook(None, write_only=True)
+    ws.append(ATTENDANCE_HEADER)
+    for row in rows:
+        ws.append(row)
+    wb.save(path)
+
+
+def read_xlsx(path):
+    wb = openpyxl.load_workbook(path, read_only=True)
+    rows = sum(1 for _ in wb.active.iter_rows(values_only=True)) - 1
+    wb.close()
+    return rows
+
+
+def read_csv(path):
+    with open(path, encoding='utf-8', newline='') as f:
+        return sum(1 for _ in csv.reader(f)) - 1
+
+
+def read_parquet(path):
+    return pq.read_table(path).num_rows
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write/load time and size of the raw attendance table per format')
+    parser.add_argument('--rows', type=int, default=100000)
+    args = parser.parse_args()
+
+    rows = list(make_rows(args.rows))
+    with tempfile.TemporaryDirectory() as tmp:
+        cases = [('xlsx', lambda path: write_xlsx(rows, path), read_xlsx)]
+        for table_format in TABLE_FORMATS:
+            readers = {'csv': read_csv, 'parquet': read_parquet}
+            cases.append((table_format, lambda path, fmt=table_format: write_table(rows, path, fmt), readers[table_format]))
+        print(f"{args.rows} rows")
+        for name, write, read in cases:
+            path = os.path.join(tmp, f'raw.{name}')
+            write_time, _ = timed(write, path)
+            read_time, count = timed(read, path)
+            size = os.path.getsize(path) / 1024 / 1024
+            print(f"{name:8s} write {write_time:7.2f} s  load {read_time * 1000:9.1f} ms  {size:7.2f} MB  rows read: {count}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+import argparse
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def make_musters(rolls, photos, workers_per_roll, store):
+    # rolls muster rolls sharing photos distinct photos, held in an ImageStore as in a run
+    from attendance_downloader import MusterRoll
+    from image_store import photo_digest
+    from muster_parser import make_record
+    from sample_pages import make_photo
+    images = []
+    for i in range(photos):
+        data = make_photo(i, size=(320, 240))
+        images.append(store.put(data, photo_digest(data)))
+    musters = []
+    for msr_no in range(1, rolls + 1):
+        att_rows = [make_record(str(i), f'KN-05-007-016-{msr_no:05d}/{i:03d}', f'WORKER {msr_no}-{i} (M)', '03/07/2025 10:00:00 AM', 'Present')
+                    for i in range(1, workers_per_roll + 1)]
+        musters.append(MusterRoll(msr_no, att_rows, images[msr_no % photos]))
+    return musters
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Save the photo workbooks with shared media and load them back with openpyxl')
+    parser.add_argument('--rolls', type=int, default=20)
+    parser.add_argument('--photos', type=int, default=5, help='distinct photos shared by the muster rolls')
+    parser.add_argument('--workers-per-roll', type=int, default=5)
+    args = parser.parse_args()
+    import openpyxl
+    from attendance_downloader import write_attendance_images_excel, write_images_excel
+    from excel_media import check_workbook, save_workbook
+    from image_store import ImageStore
+    print(f"openpyxl {openpyxl.__version__}: {args.rolls} muster rolls, {args.photos} distinct photos")
+    failed = False
+    with ImageStore() as store:
+        musters = make_musters(args.rolls, args.photos, args.workers_per_roll, store)
+        for write_only in (False, True):
+            for writer in (write_images_excel, write_attendance_images_excel):
+                wb = writer(musters, 'WC/1', 'Check work', 'BALAKUNDHI', 'check', write_only)
+                out = io.BytesIO()
+                save_workbook(wb, out)
+                images, media = check_workbook(out)
+                ok = images == args.rolls and media == min(args.photos, args.rolls)
+                failed = failed or not ok
+                print(f"{writer.__name__:32s} {'write-only' if write_only else 'in-memory':10s}  "
+                      f"images {images:4d}  media parts {media:4d}  {'ok' if ok else 'FAILED'}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
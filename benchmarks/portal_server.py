@@ -0,0 +1,268 @@
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote_plus, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sample_pages import make_empty_page, make_muster_page, make_photo
+
+# Local stand-in for the NREGA portal: the attendance date form and drill-down
+# pages attend_2way walks (state, district, block, panchayath, muster roll list),
+# the muster roll pages run_attendance_downloader requests, and the photos.
+# Pages are synthetic unless a directory of recorded muster pages is given.
+PREFIX = '/nregaarch/'
+FORM_PAGE = 'View_NMMS_atten_date_new.aspx'
+MUSTER_PAGE = 'View_NMMS_atten_date_dtl_rpt.aspx'
+DEFAULT_DATES = ('03/07/2025', '04/07/2025')
+DEFAULT_PANCHAYATHS = ('BALAKUNDHI', 'HACHOLLI', 'KARURU')
+# Photos are expensive to synthesize; this many distinct ones are reused
+DISTINCT_PHOTOS = 16
+
+
+class PortalConfig:
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, workers_per_roll=20, rolls_per_panchayath=20,
+                 empty_every=5, photo_size=(1280, 960), dates=DEFAULT_DATES, panchayaths=DEFAULT_PANCHAYATHS,
+                 pages_dir=None, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        # Fraction of requests answered with 503, which the client's retry policy absorbs
+        self.error_rate = error_rate
+        self.workers_per_roll = workers_per_roll
+        self.rolls_per_panchayath = rolls_per_panchayath
+        # Every n-th muster number has no attendance, like gaps in a real range
+        self.empty_every = empty_every
+        self.photo_size = tuple(photo_size)
+        self.dates = list(dates)
+        self.panchayaths = list(panchayaths)
+        self.pages_dir = pages_dir
+        self.seed = seed
+
+
+class PortalStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = 0
+            self.errors = 0
+            self.bytes = 0
+            self.by_kind = {}
+
+    def record(self, kind, nbytes, error=False):
+        with self.lock:
+            self.requests += 1
+            self.errors += error
+            self.bytes += nbytes
+            self.by_kind[kind] = self.by_kind.get(kind, 0) + 1
+
+    def as_dict(self):
+        with self.lock:
+            return {'requests': self.requests, 'errors': self.errors, 'bytes': self.bytes, 'by_kind': dict(self.by_kind)}
+
+
+class PortalServer:
+    def __init__(self, config=None, host='127.0.0.1', port=0):
+        self.config = config or PortalConfig()
+        self.stats = PortalStats()
+        self.random = random.Random(self.config.seed)
+        self.random_lock = threading.Lock()
+        self.recorded = self._load_recorded(self.config.pages_dir)
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}{PREFIX}"
+
+    @property
+    def form_url(self):
+        # attend_2way.BASE_URL
+        return f"{self.base_url}{FORM_PAGE}?fin_year=2024-2025&Digest=bench"
+
+    @property
+    def muster_url(self):
+        # attendance_downloader.STARTING_URL
+        return f"{self.base_url}{MUSTER_PAGE}?page=&short_name=KN&state_name=KARNATAKA&state_code=15&"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    @staticmethod
+    def _load_recorded(pages_dir):
+        if not pages_dir:
+            return []
+        pages = []
+        for name in sorted(os.listdir(pages_dir)):
+            if name.endswith('.html'):
+                with open(os.path.join(pages_dir, name), 'rb') as f:
+                    pages.append(f.read())
+        return pages
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                self._serve(parse_qs(urlparse(self.path).query))
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                form = parse_qs(self.rfile.read(length).decode('utf-8'))
+                self._serve(form, post=True)
+
+            def _serve(self, params, post=False):
+                path = urlparse(self.path).path
+                kind, body, content_type = server.route(path, {k: v[0] for k, v in params.items()}, post)
+                config = server.config
+                with server.random_lock:
+                    delay = config.latency + server.random.uniform(0, config.jitter)
+                    fail = server.random.random() < config.error_rate
+                if delay:
+                    time.sleep(delay)
+                if fail:
+                    kind, body, content_type = 'error', b'Service Unavailable', 'text/plain'
+                status = 503 if fail else (200 if body is not None else 404)
+                body = body if body is not None else b'Not Found'
+                server.stats.record(kind, len(body), error=status != 200)
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    def route(self, path, params, post=False):
+        if not path.startswith(PREFIX):
+            return 'other', None, 'text/plain'
+        page = path[len(PREFIX):]
+        date = params.get('date') or params.get('ctl00$ContentPlaceHolder1$ddl_attendance') or self.config.dates[0]
+        if page == FORM_PAGE:
+            return 'navigation', self.state_page(date) if post else self.form_page(), 'text/html; charset=utf-8'
+        if page == 'district.aspx':
+            return 'navigation', self.link_table('District', 'BALLARI', f'block.aspx?date={quote(date)}'), 'text/html; charset=utf-8'
+        if page == 'block.aspx':
+            return 'navigation', self.link_table('Block', 'SIRUGUPPA', f'panchayaths.aspx?date={quote(date)}'), 'text/html; charset=utf-8'
+        if page == 'panchayaths.aspx':
+            return 'navigation', self.panchayath_page(date), 'text/html; charset=utf-8'
+        if page == 'musters.aspx':
+            return 'navigation', self.muster_list_page(params.get('p', ''), date), 'text/html; charset=utf-8'
+        if page == MUSTER_PAGE:
+            msr_no = int(params.get('msr_no') or 0)
+            date = params.get('AttendanceDate') or date
+            return 'muster', self.muster_page(msr_no, unquote_plus(date)), 'text/html; charset=utf-8'
+        if page.startswith('photo/'):
+            return 'photo', self.photo(int(page.split('/')[1].split('.')[0])), 'image/jpeg'
+        return 'other', None, 'text/plain'
+
+    def form_page(self):
+        options = ''.join(f'<option value="{d}">{d}</option>' for d in self.config.dates)
+        return (f'<html><body><form method="post" action="./{FORM_PAGE}">'
+                f'<input type="hidden" name="__VIEWSTATE" id="__VIEWSTATE" value="vs" />'
+                f'<input type="hidden" name="__VIEWSTATEGENERATOR" id="__VIEWSTATEGENERATOR" value="gen" />'
+                f'<input type="hidden" name="__EVENTVALIDATION" id="__EVENTVALIDATION" value="ev" />'
+                f'<select name="ctl00$ContentPlaceHolder1$ddl_attendance">{options}</select>'
+                f'</form></body></html>').encode('utf-8')
+
+    def state_page(self, date):
+        return self.link_table('State', 'KARNATAKA', f'district.aspx?date={quote(date)}')
+
+    @staticmethod
+    def link_table(label, name, href):
+        return (f'<html><body><table id="grdTable"><tr><th>S.No</th><th>{label}</th></tr>'
+                f'<tr><td>1</td><td><a href="{href}">{name}</a></td></tr></table></body></html>').encode('utf-8')
+
+    def panchayath_page(self, date):
+        rows = ''.join(
+            f'<tr><td>{i}</td><td>{name}</td><td>{self.config.rolls_per_panchayath}</td>'
+            f'<td><a href="musters.aspx?p={quote(name)}&date={quote(date)}">{self.config.rolls_per_panchayath}</a></td></tr>'
+            for i, name in enumerate(self.config.panchayaths, 1)
+        )
+        return (f'<html><body><div id="RepPr1"><table><tr><th>S.No</th><th>Panchayat</th><th>Works</th><th>Muster Rolls</th></tr>'
+                f'{rows}</table></div></body></html>').encode('utf-8')
+
+    def panchayath_msr_base(self, name):
+        return (self.config.panchayaths.index(name) + 1) * 10000 if name in self.config.panchayaths else 0
+
+    def muster_list_page(self, name, date):
+        base = self.panchayath_msr_base(name)
+        rows = ''.join(
+            f'<tr><td>{i}</td><td>1505007016/IF/{base + i // 5}</td>'
+            f'<td><a href="{MUSTER_PAGE}?panchayat_name={quote(name)}&work_code=1505007016/IF/{base + i // 5}'
+            f'&msr_no={base + i}&AttendanceDate={quote(date)}">{base + i}</a></td></tr>'
+            for i in range(1, self.config.rolls_per_panchayath + 1)
+        )
+        return (f'<html><body><div id="RepPr1"><table><tr><th>S.No</th><th>Work Code</th><th>MustRoll No.</th></tr>'
+                f'{rows}</table></div></body></html>').encode('utf-8')
+
+    def muster_page(self, msr_no, date):
+        if self.config.empty_every and msr_no % self.config.empty_every == 0:
+            return _empty_page(msr_no)
+        if self.recorded:
+            return self.recorded[msr_no % len(self.recorded)]
+        return _muster_page(msr_no, self.config.workers_per_roll, f'{self.base_url}photo/{msr_no}.jpg', date)
+
+    def photo(self, msr_no):
+        return _photo(msr_no % DISTINCT_PHOTOS, self.config.photo_size)
+
+
+@lru_cache(maxsize=4096)
+def _muster_page(msr_no, workers, photo_url, date):
+    return make_muster_page(msr_no, workers=workers, photo_url=photo_url, attendance_date=date)
+
+
+@lru_cache(maxsize=4096)
+def _empty_page(msr_no):
+    return make_empty_page(msr_no)
+
+
+@lru_cache(maxsize=DISTINCT_PHOTOS)
+def _photo(seed, size):
+    return make_photo(seed, size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve a local stand-in for the NREGA attendance portal')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='extra random delay, up to this many seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of responses that are 503')
+    parser.add_argument('--workers-per-roll', type=int, default=20)
+    parser.add_argument('--rolls-per-panchayath', type=int, default=20)
+    parser.add_argument('--pages', help='directory of recorded muster pages (*.html)')
+    args = parser.parse_args()
+    config = PortalConfig(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                          workers_per_roll=args.workers_per_roll, rolls_per_panchayath=args.rolls_per_panchayath,
+                          pages_dir=args.pages)
+    server = PortalServer(config, port=args.port)
+    print(f"attend_2way BASE_URL:                 {server.form_url}")
+    print(f"attendance_downloader STARTING_URL:   {server.muster_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
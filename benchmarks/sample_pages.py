@@ -0,0 +1,69 @@
+import base64
+import io
+import os
+import random
+
+# Synthetic stand-ins for the NREGA portal pages, shaped like the live markup
+# (ASP.NET form, layout tables, worker grid as the last table on the page).
+
+
+def _viewstate(size=20000, seed=0):
+    rnd = random.Random(seed)
+    return base64.b64encode(bytes(rnd.getrandbits(8) for _ in range(size))).decode()
+
+
+def make_muster_page(msr_no, workers=40, photo_url=None, attendance_date='03/07/2025', work_code='1505007016/IC/93393042892330899'):
+    rnd = random.Random(msr_no)
+    rows = []
+    for i in range(1, workers + 1):
+        gender = 'M' if rnd.random() < 0.5 else 'F'
+        status = 'Present' if rnd.random() < 0.85 else 'Absent'
+        rows.append(
+            f'<tr style="font-size:Small;">'
+            f'<td align="center">{i}</td>'
+            f'<td><span id="ContentPlaceHolder1_grdData_lbl_jobcard_{i - 1}">KN-05-007-016-{msr_no:05d}/{i:03d}</span></td>'
+            f'<td><span id="ContentPlaceHolder1_grdData_lbl_workerName_{i - 1}">WORKER {msr_no}-{i} ({gender})</span></td>'
+            f'<td align="center">{attendance_date} 10:{i % 60:02d}:00 AM</td>'
+            f'<td align="center">{status}</td>'
+            f'</tr>'
+        )
+    photo = f'<a href="{photo_url}" target="_blank">Click here for large image</a>' if photo_url else ''
+    return f'''<!DOCTYPE html>
+<html xmlns="http://www.w3.org/1999/xhtml"><head><meta http-equiv="Content-Type" content="text/html; charset=utf-8" /><title>NMMS Attendance</title></head>
+<body><form method="post" action="./View_NMMS_atten_date_dtl_rpt.aspx" id="form1">
+<input type="hidden" name="__VIEWSTATE" id="__VIEWSTATE" value="{_viewstate(seed=msr_no)}" />
+<table width="100%"><tr><td align="center"><b>Mahatma Gandhi National Rural Employment Guarantee Act</b></td></tr>
+<tr><td><table><tr><td><b>State</b> : KARNATAKA</td><td><b>District</b> : BALLARI</td><td><b>Block</b> : SIRUGUPPA</td></tr>
+<tr><td><b>Work Code</b> : {work_code}</td><td><b>Work Name</b> : Desilting of Kere at Balakundhi {msr_no}</td><td><b>Muster Roll No</b> : {msr_no}</td></tr></table></td></tr>
+<tr><td>{photo}</td></tr></table>
+<div style="overflow:auto;"><table class="table" cellspacing="0" rules="all" border="1" id="ContentPlaceHolder1_grdData" style="border-collapse:collapse;">
+<tr><th scope="col">S.No</th><th scope="col">Job Card No</th><th scope="col">Worker Name(Gender)</th><th scope="col">Attendance Date</th><th scope="col">Present/Absent</th></tr>
+{''.join(rows)}
+</table></div></form></body></html>'''.encode('utf-8')
+
+
+def make_empty_page(msr_no):
+    return f'''<!DOCTYPE html><html><head><title>NMMS Attendance</title></head><body>
+<form method="post" id="form1"><input type="hidden" name="__VIEWSTATE" id="__VIEWSTATE" value="{_viewstate(2000, msr_no)}" />
+<span id="ContentPlaceHolder1_lbl_msg">No Record Found</span></form></body></html>'''.encode('utf-8')
+
+
+def make_photo(msr_no, size=(1280, 960)):
+    from PIL import Image
+    rnd = random.Random(msr_no)
+    img = Image.effect_noise(size, 40 + rnd.random() * 20).convert('RGB')
+    buf = io.BytesIO()
+    img.save(buf, 'JPEG', quality=90)
+    return buf.getvalue()
+
+
+def load_pages(directory=None, count=50, workers=40):
+    # Recorded pages (*.html) win over synthetic ones when a directory is given
+    if directory:
+        pages = []
+        for name in sorted(os.listdir(directory)):
+            if name.endswith('.html'):
+                with open(os.path.join(directory, name), 'rb') as f:
+                    pages.append(f.read())
+        return pages
+    return [make_muster_page(n, workers=workers, photo_url=f'https://example.invalid/photo/{n}.jpg') for n in range(1, count + 1)]
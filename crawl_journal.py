@@ -0,0 +1,120 @@
+import json
+import os
+import re
+import threading
+import time
+
+import http_cache
+from muster_index import is_past_date
+from muster_parser import make_records
+
+# Append-only JSONL journal of an attend_2way crawl. Every completed navigation
+# step and fetched muster roll is written as one line, so a rerun for the same
+# date/panchayath picks up where the last one stopped. A finished crawl is not
+# replayed: its journal is marked complete and the next run starts a new one.
+CHECKPOINT_DIR = os.path.join(http_cache.CACHE_DIR, 'checkpoints')
+# A crawl for today (or a later date) can only be resumed for this long; after that
+# its muster rolls may have been filled in further and the crawl starts over
+CURRENT_JOURNAL_TTL_SECONDS = 3600
+
+
+def muster_result(data):
+    # JSON gives back lists; restore the parser's records and header tuple
+    attendance_data, photo_url, work_name, header_cells = data
+    return make_records(attendance_data), photo_url, work_name, tuple(header_cells) if header_cells is not None else None
+
+
+class CrawlJournal:
+    def __init__(self, attendance_date, panchayath_name, directory=None, fresh=False, enabled=None):
+        # Only an unfinished crawl is resumed: a complete or expired journal, or any
+        # journal with the cache disabled (NREGA_CACHE=0), is started over
+        enabled = http_cache.CACHE_ENABLED if enabled is None else enabled
+        name = re.sub(r'[^A-Za-z0-9]+', '_', f"{panchayath_name}_{attendance_date}").strip('_')
+        directory = directory or CHECKPOINT_DIR
+        self.path = os.path.join(directory, f"{name}.jsonl")
+        self.lock = threading.Lock()
+        self.reset()
+        os.makedirs(directory, exist_ok=True)
+        if enabled and not fresh:
+            self.load()
+            fresh = self.complete or self.expired(attendance_date)
+        if (fresh or not enabled) and os.path.exists(self.path):
+            os.remove(self.path)
+            self.reset()
+        new = not os.path.exists(self.path)
+        self.file = open(self.path, 'a', encoding='utf-8')
+        if new:
+            self.started = time.time()
+            self._write({'type': 'start', 'at': self.started})
+
+    def reset(self):
+        self.nav = {}
+        self.musters = {}
+        self.complete = False
+        self.started = None
+
+    def expired(self, attendance_date):
+        if is_past_date(attendance_date):
+            return False
+        try:
+            # Journals written before the start entry existed date from their file
+            started = self.started or os.path.getmtime(self.path)
+        except OSError:
+            return False
+        return time.time() - started > CURRENT_JOURNAL_TTL_SECONDS
+
+    def load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                lines = f.readlines()
+        except OSError:
+            return
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # A run killed mid-write leaves a partial last line
+                continue
+            kind = entry.get('type')
+            if kind == 'start':
+                self.started = entry['at']
+            elif kind == 'nav':
+                self.nav[entry['step']] = entry['url']
+            elif kind == 'reset_nav':
+                self.nav = {}
+            elif kind == 'muster':
+                self.musters[entry['url']] = muster_result(entry['data'])
+            elif kind == 'complete':
+                self.complete = True
+
+    def _write(self, entry):
+        with self.lock:
+            self.file.write(json.dumps(entry) + '\n')
+            self.file.flush()
+
+    def record_nav(self, step, url):
+        self.nav[step] = url
+        self._write({'type': 'nav', 'step': step, 'url': url})
+
+    def forget_nav(self):
+        # Stored links stopped working; navigate from the top again
+        self.nav = {}
+        self._write({'type': 'reset_nav'})
+
+    def get_muster(self, url):
+        return self.musters.get(url)
+
+    def record_muster(self, url, data):
+        self.musters[url] = tuple(data)
+        self._write({'type': 'muster', 'url': url, 'data': list(data)})
+
+    def mark_complete(self):
+        self.complete = True
+        self._write({'type': 'complete'})
+
+    def close(self):
+        self.file.close()
+
+    @property
+    def resumed_musters(self):
+        return len(self.musters)
@@ -0,0 +1,100 @@
+import hashlib
+import posixpath
+import re
+import shutil
+import tempfile
+from xml.etree import ElementTree
+from zipfile import ZIP_DEFLATED, ZipFile
+
+from openpyxl import load_workbook
+
+# openpyxl writes one xl/media part per embedded image, even when several muster
+# rolls carry the same photo. After a normal Workbook.save, the saved package is
+# rewritten with one media part per distinct photo (by content hash) and every
+# drawing relationship pointed at it. Only the xlsx format is relied on, not
+# openpyxl's writer internals.
+MEDIA_DIR = 'xl/media/'
+DRAWING_RELS_DIR = 'xl/drawings/_rels/'
+RELATIONSHIP_TARGET = re.compile(rb'Target="([^"]+)"')
+
+
+def save_workbook(workbook, target):
+    # Workbook.save with shared media parts; target is a file name or a binary file object
+    with tempfile.TemporaryFile() as saved:
+        workbook.save(saved)
+        saved.seek(0)
+        share_media(saved, target)
+
+
+def duplicate_media(archive):
+    # Duplicate media part -> the first part with the same bytes
+    first = {}
+    duplicates = {}
+    for name in archive.namelist():
+        if name.startswith(MEDIA_DIR):
+            kept = first.setdefault(hashlib.sha256(archive.read(name)).hexdigest(), name)
+            if kept != name:
+                duplicates[name] = kept
+    return duplicates
+
+
+def point_relationships(rels, duplicates):
+    # Targets are absolute ("/xl/media/image2.jpeg") or relative to xl/drawings
+    def retarget(match):
+        target = match.group(1).decode('utf-8')
+        if target.startswith('/'):
+            kept = duplicates.get(target[1:])
+            new = kept and '/' + kept
+        else:
+            kept = duplicates.get(posixpath.normpath(posixpath.join('xl/drawings', target)))
+            new = kept and posixpath.relpath(kept, 'xl/drawings')
+        return b'Target="%s"' % new.encode('utf-8') if new else match.group(0)
+    return RELATIONSHIP_TARGET.sub(retarget, rels)
+
+
+def share_media(source, target):
+    # Copies the xlsx package in source to target without its duplicate media parts
+    with ZipFile(source) as archive:
+        duplicates = duplicate_media(archive)
+        if duplicates:
+            with ZipFile(target, 'w', ZIP_DEFLATED, allowZip64=True) as out:
+                for info in archive.infolist():
+                    if info.filename in duplicates:
+                        continue
+                    data = archive.read(info)
+                    if info.filename.startswith(DRAWING_RELS_DIR):
+                        data = point_relationships(data, duplicates)
+                    out.writestr(info, data)
+            return
+    source.seek(0)
+    if hasattr(target, 'write'):
+        shutil.copyfileobj(source, target)
+    else:
+        with open(target, 'wb') as f:
+            shutil.copyfileobj(source, f)
+
+
+def check_workbook(source):
+    # Every picture in every drawing must point at a media part in the package, and
+    # openpyxl must load the workbook back. Returns (images, media parts); source is
+    # a file name or a binary file object
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    with ZipFile(source) as archive:
+        names = set(archive.namelist())
+        media = [name for name in names if name.startswith(MEDIA_DIR)]
+        images = 0
+        for name in sorted(names):
+            if name.startswith(DRAWING_RELS_DIR):
+                for target in RELATIONSHIP_TARGET.findall(archive.read(name)):
+                    target = target.decode('utf-8')
+                    part = target[1:] if target.startswith('/') else posixpath.normpath(posixpath.join('xl/drawings', target))
+                    if part.startswith(MEDIA_DIR) and part not in names:
+                        raise ValueError(f"{name} points at missing {part}")
+            elif name.startswith('xl/drawings/') and name.endswith('.xml'):
+                drawing = ElementTree.fromstring(archive.read(name))
+                images += sum(1 for el in drawing.iter() if el.tag.rsplit('}', 1)[-1] == 'pic')
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    load_workbook(source)
+    return images, len(media)
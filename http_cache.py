@@ -0,0 +1,167 @@
+import hashlib
+import os
+import threading
+import time
+import progress
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# On-disk cache for muster pages and photos. Attendance for past dates does not
+# change, so a repeat export can be served entirely from here.
+CACHE_ENABLED = os.environ.get('NREGA_CACHE', '1') != '0'
+CACHE_DIR = os.environ.get('NREGA_CACHE_DIR', '.nrega_cache')
+# Muster pages for past dates are final and never expire; the size limit still
+# evicts the least recently used. Only pages with attendance rows are kept for them.
+HTML_TTL_SECONDS = None
+# Pages for today (or an unknown date) can still change while rolls are filled in
+CURRENT_HTML_TTL_SECONDS = 5 * 60
+IMAGE_TTL_SECONDS = 30 * 24 * 3600
+HTML_MAX_BYTES = 256 * 1024 * 1024
+IMAGE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+# Evict down to this fraction of the limit so eviction does not run on every put
+EVICT_TO_FRACTION = 0.9
+
+
+def normalize_url(url):
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, query, ''))
+
+
+class DiskCache:
+    # Entry mtime records when it was fetched (TTL, None for no expiry); atime records
+    # the last hit (LRU)
+    def __init__(self, directory, ttl_seconds, max_bytes):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.total_bytes = None
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, url):
+        digest = hashlib.sha256(normalize_url(url).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def get(self, url, ttl_seconds=None):
+        # ttl_seconds overrides the cache's TTL for this lookup
+        ttl_seconds = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        path = self._path(url)
+        try:
+            stat = os.stat(path)
+            now = time.time()
+            if ttl_seconds is not None and now - stat.st_mtime > ttl_seconds:
+                self._remove(path, stat.st_size)
+                self.misses += 1
+                return None
+            with open(path, 'rb') as f:
+                content = f.read()
+            os.utime(path, (now, stat.st_mtime))
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return content
+
+    def put(self, url, content):
+        path = self._path(url)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Error writing cache entry: {e}")
+            return
+        with self.lock:
+            if self.total_bytes is None:
+                self.total_bytes = self._scan_size()
+            else:
+                self.total_bytes += len(content)
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def discard(self, url):
+        path = self._path(url)
+        try:
+            size = os.stat(path).st_size
+        except OSError:
+            return
+        self._remove(path, size)
+
+    def _remove(self, path, size):
+        try:
+            os.remove(path)
+        except OSError:
+            return
+        with self.lock:
+            if self.total_bytes is not None:
+                self.total_bytes -= size
+
+    def _entries(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    yield path, os.stat(path)
+                except OSError:
+                    continue
+
+    def _scan_size(self):
+        return sum(stat.st_size for _, stat in self._entries())
+
+    def _evict(self):
+        # Called with self.lock held: drop least recently used entries
+        target = self.max_bytes * EVICT_TO_FRACTION
+        entries = sorted(self._entries(), key=lambda entry: entry[1].st_atime)
+        total = sum(stat.st_size for _, stat in entries)
+        for path, stat in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= stat.st_size
+            except OSError:
+                continue
+        self.total_bytes = total
+
+    def clear(self):
+        with self.lock:
+            for path, _ in list(self._entries()):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self.total_bytes = 0
+
+
+html_cache = DiskCache(os.path.join(CACHE_DIR, 'html'), HTML_TTL_SECONDS, HTML_MAX_BYTES)
+image_cache = DiskCache(os.path.join(CACHE_DIR, 'img'), IMAGE_TTL_SECONDS, IMAGE_MAX_BYTES)
+
+
+def cache_lookup(cache, url, ttl_seconds=None):
+    # ttl_seconds=0 never hits
+    if not CACHE_ENABLED or ttl_seconds == 0:
+        return None
+    content = cache.get(url, ttl_seconds)
+    if content is not None:
+        progress.record_cache_hit(len(content))
+    return content
+
+
+def cache_store(cache, url, content):
+    if CACHE_ENABLED:
+        cache.put(url, content)
+
+
+def cached_fetch(cache, url, fetch, ttl_seconds=None):
+    # fetch(url) must return the response bytes or raise; only successful fetches are stored.
+    # ttl_seconds=0 always fetches (and refreshes the entry)
+    content = cache_lookup(cache, url, ttl_seconds)
+    if content is None:
+        content = fetch(url)
+        cache_store(cache, url, content)
+    return content
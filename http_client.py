@@ -0,0 +1,137 @@
+import os
+import threading
+import time
+import requests
+import progress
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlparse
+from urllib3.util.retry import Retry
+
+# Shared transport for attendance_downloader and attend_2way: one pooled,
+# retrying, rate limited session for every request made to the NREGA portal.
+DEFAULT_TIMEOUT = (10, 60)  # (connect, read) seconds
+DEFAULT_POOL_SIZE = 8
+MAX_RETRIES = 4
+BACKOFF_FACTOR = 1.0  # sleeps 0, 2, 4, 8 ... seconds between retries
+RETRY_STATUSES = (500, 502, 503, 504)
+RATE_LIMIT_PER_SEC = 10.0
+RATE_LIMIT_BURST = 10
+# Politeness: never keep more than this many requests in flight to one host. Unset,
+# the cap follows the session's pool size, i.e. the worker count the caller asked for
+MAX_REQUESTS_PER_HOST = int(os.environ.get('NREGA_MAX_PER_HOST', '0')) or None
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
+}
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+_rate_limiter = TokenBucket(RATE_LIMIT_PER_SEC, RATE_LIMIT_BURST)
+_session = None
+_pool_size = 0
+_session_lock = threading.Lock()
+_host_limit = None
+_host_slots = {}
+_host_slots_lock = threading.Lock()
+
+
+def set_host_limit(limit):
+    global _host_limit
+    limit = max(1, limit)
+    with _host_slots_lock:
+        if limit != _host_limit:
+            # Requests in flight release the semaphore they took; new ones use the new cap
+            _host_limit = limit
+            _host_slots.clear()
+
+
+def host_slot(url):
+    host = urlparse(url).netloc
+    with _host_slots_lock:
+        slot = _host_slots.get(host)
+        if slot is None:
+            slot = threading.BoundedSemaphore(_host_limit or MAX_REQUESTS_PER_HOST or DEFAULT_POOL_SIZE)
+            _host_slots[host] = slot
+    return slot
+
+
+def _make_adapter(pool_size):
+    retry = Retry(
+        total=MAX_RETRIES,
+        connect=MAX_RETRIES,
+        read=MAX_RETRIES,
+        status=MAX_RETRIES,
+        backoff_factor=BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(['GET', 'HEAD', 'POST']),
+        raise_on_status=False,
+    )
+    return HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+
+def get_session(pool_size=None, max_per_host=None):
+    # pool_size is the number of threads that will share the session; max_per_host
+    # (else MAX_REQUESTS_PER_HOST, else the pool size) caps requests in flight per host
+    global _session, _pool_size
+    pool_size = max(1, pool_size or DEFAULT_POOL_SIZE)
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            _session.headers.update(HEADERS)
+        if pool_size > _pool_size:
+            adapter = _make_adapter(pool_size)
+            _session.mount('https://', adapter)
+            _session.mount('http://', adapter)
+            _pool_size = pool_size
+        set_host_limit(max_per_host or MAX_REQUESTS_PER_HOST or _pool_size)
+        return _session
+
+
+def request(method, url, session=None, **kwargs):
+    session = session or get_session()
+    kwargs.setdefault('timeout', DEFAULT_TIMEOUT)
+    attempt = 0
+    while True:
+        _rate_limiter.acquire()
+        try:
+            with host_slot(url):
+                response = session.request(method, url, **kwargs)
+                # Read the body while holding the slot so the pooled connection is released here
+                response.content
+            retry_state = getattr(response.raw, 'retries', None)
+            progress.record_request(len(response.content), attempt + len(getattr(retry_state, 'history', None) or ()))
+            return response
+        except requests.exceptions.ChunkedEncodingError:
+            # Connection reset mid-body; urllib3 only retries up to the response headers
+            attempt += 1
+            if attempt > MAX_RETRIES:
+                raise
+            time.sleep(BACKOFF_FACTOR * (2 ** attempt))
+
+
+def http_get(url, session=None, **kwargs):
+    return request('GET', url, session=session, **kwargs)
+
+
+def http_post(url, session=None, **kwargs):
+    return request('POST', url, session=session, **kwargs)
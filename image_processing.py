@@ -0,0 +1,68 @@
+import io
+import threading
+import zipfile
+
+from PIL import Image as PILImage
+
+from process_pool import start_process_pool
+
+# Photos are shown in a ~100pt row / 20 character column, so anything beyond a few
+# hundred pixels only inflates the workbook. Resize to this box and recompress.
+IMAGE_MAX_SIZE = (480, 360)
+JPEG_QUALITY = 70
+
+
+def shrink_image(data, max_size=IMAGE_MAX_SIZE, quality=JPEG_QUALITY):
+    try:
+        with PILImage.open(io.BytesIO(data)) as img:
+            img.draft('RGB', max_size)  # lets JPEG decode at reduced scale
+            img = img.convert('RGB')
+            img.thumbnail(max_size, PILImage.LANCZOS)
+            out = io.BytesIO()
+            img.save(out, 'JPEG', quality=quality, optimize=True)
+    except Exception as e:
+        print(f"Error processing photo, keeping original: {e}")
+        return data
+    shrunk = out.getvalue()
+    # Never make a photo bigger than it was
+    return shrunk if len(shrunk) < len(data) else data
+
+
+class ImageProcessor:
+    def __init__(self, max_size=IMAGE_MAX_SIZE, quality=JPEG_QUALITY, workers=0):
+        self.max_size = tuple(max_size)
+        self.quality = quality
+        # workers > 0 moves decode/resize/encode into a process pool; called from the
+        # fetch threads, each thread just waits for its own photo
+        self.pool = start_process_pool(workers) if workers else None
+
+    def __call__(self, data):
+        if not data:
+            return data
+        if self.pool is not None:
+            return self.pool.submit(shrink_image, data, self.max_size, self.quality).result()
+        return shrink_image(data, self.max_size, self.quality)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+
+class OriginalsArchive:
+    # Zip of the untouched downloads, for when the full-resolution photos are needed
+    def __init__(self):
+        self.buffer = io.BytesIO()
+        self.zip = zipfile.ZipFile(self.buffer, 'w', zipfile.ZIP_STORED)
+        self.lock = threading.Lock()
+
+    def add(self, name, data):
+        if not data:
+            return
+        with self.lock:
+            self.zip.writestr(name, data)
+
+    def close(self):
+        self.zip.close()
+        self.buffer.seek(0)
+        return self.buffer
@@ -0,0 +1,122 @@
+import hashlib
+import io
+import os
+import tempfile
+import threading
+
+# Holds every downloaded photo exactly once. Writers get cheap views instead of
+# copies: io.BytesIO over an immutable bytes object shares its buffer until written
+# to, and spilled photos are handed to openpyxl as a file path it reads at save time.
+# Photos are addressed by a hash of the downloaded bytes, with a URL -> hash index,
+# so a photo linked from several muster rolls (or dates) is fetched, resized and
+# held once, and the same photo uploaded to several rolls is recognised.
+MEMORY_LIMIT_BYTES = 256 * 1024 * 1024
+
+
+def photo_digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class StoredImage:
+    __slots__ = ('data', 'path', 'size', 'digest')
+
+    def __init__(self, data=None, path=None, size=0, digest=None):
+        self.data = data
+        self.path = path
+        self.size = size
+        # Hash of the photo as downloaded, before any resizing
+        self.digest = digest
+
+    def open(self):
+        if self.data is not None:
+            return io.BytesIO(self.data)
+        return open(self.path, 'rb')
+
+    def read(self):
+        if self.data is not None:
+            return self.data
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    def excel_ref(self):
+        # openpyxl closes the file object it is given when the workbook is saved, so
+        # every embedded image needs its own view; a path keeps no file handle open
+        return self.path if self.data is None else io.BytesIO(self.data)
+
+
+class ImageStore:
+    def __init__(self, memory_limit=MEMORY_LIMIT_BYTES):
+        self.memory_limit = memory_limit
+        self.memory_bytes = 0
+        self.spill_dir = None
+        self.count = 0
+        self.lock = threading.Lock()
+        self.by_digest = {}
+        self.by_url = {}
+
+    def get(self, digest):
+        with self.lock:
+            return self.by_digest.get(digest)
+
+    def get_url(self, url):
+        with self.lock:
+            digest = self.by_url.get(url)
+            return self.by_digest.get(digest) if digest is not None else None
+
+    def index_url(self, url, digest):
+        with self.lock:
+            self.by_url[url] = digest
+
+    def put(self, data, digest=None):
+        # digest is the hash of the downloaded photo when data is its resized copy;
+        # a photo already held under the same digest is returned instead of stored again
+        if not data:
+            return None
+        if digest is not None:
+            stored = self.get(digest)
+            if stored is not None:
+                return stored
+        image = self._store(data, digest)
+        if digest is None:
+            return image
+        with self.lock:
+            # Another thread may have stored the same photo meanwhile; keep the first
+            return self.by_digest.setdefault(digest, image)
+
+    def _store(self, data, digest):
+        with self.lock:
+            self.count += 1
+            index = self.count
+            spill = self.memory_bytes + len(data) > self.memory_limit
+            if spill:
+                if self.spill_dir is None:
+                    self.spill_dir = tempfile.TemporaryDirectory(prefix='nrega_images_')
+            else:
+                self.memory_bytes += len(data)
+        if not spill:
+            return StoredImage(data=bytes(data), size=len(data), digest=digest)
+        path = os.path.join(self.spill_dir.name, f'{index}.img')
+        with open(path, 'wb') as f:
+            f.write(data)
+        return StoredImage(path=path, size=len(data), digest=digest)
+
+    def close(self):
+        if self.spill_dir is not None:
+            self.spill_dir.cleanup()
+            self.spill_dir = None
+        self.memory_bytes = 0
+        self.by_digest.clear()
+        self.by_url.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def image_view(image):
+    # Accepts a StoredImage or a plain BytesIO from download_photo
+    if isinstance(image, StoredImage):
+        return image.excel_ref()
+    return io.BytesIO(image.getvalue())
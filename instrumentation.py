@@ -0,0 +1,202 @@
+import cProfile
+import io
+import json
+import platform
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import progress
+
+try:
+    import pyinstrument
+    from pyinstrument.renderers import HTMLRenderer
+    from pyinstrument.session import Session
+except ImportError:  # optional, cProfile is always available
+    pyinstrument = None
+
+# Opt-in instrumentation of a whole run: the progress tracker's per-stage timers
+# and counters, optionally a profile of every thread the run binds the tracker to,
+# and a JSON timing report. Nothing here is touched unless a run asks for it.
+PROFILERS = ('cprofile', 'pyinstrument')
+REPORT_VERSION = 1
+TOP_FUNCTIONS = 30
+COUNTERS = ('completed', 'total', 'requests', 'bytes', 'cache_hits', 'cache_bytes', 'retries', 'fetch_errors')
+
+
+class ThreadProfiler:
+    # cProfile and pyinstrument only see the thread that starts them, so each thread
+    # bound to the run gets its own profiler (kept across pool tasks) and the results
+    # are merged at the end. Photo resizing in an image process pool is not covered.
+    def __init__(self, kind='cprofile'):
+        if kind not in PROFILERS:
+            raise ValueError(f"Unknown profiler {kind!r}, expected one of {', '.join(PROFILERS)}")
+        if kind == 'pyinstrument' and pyinstrument is None:
+            raise ValueError("pyinstrument is not installed (pip install pyinstrument)")
+        self.kind = kind
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.profilers = []
+        self.sessions = []
+
+    def enter(self):
+        depth = getattr(self.local, 'depth', 0)
+        self.local.depth = depth + 1
+        if depth:
+            return
+        if self.kind == 'pyinstrument':
+            self.local.profiler = pyinstrument.Profiler()
+            self.local.profiler.start()
+            return
+        profiler = getattr(self.local, 'profiler', None)
+        if profiler is None:
+            profiler = self.local.profiler = cProfile.Profile()
+            with self.lock:
+                self.profilers.append(profiler)
+        try:
+            profiler.enable()
+            self.local.enabled = True
+        except ValueError:
+            # Python 3.12+: profiling is process-wide and the first thread's profiler already sees this one
+            self.local.enabled = False
+
+    def exit(self):
+        self.local.depth -= 1
+        if self.local.depth:
+            return
+        if self.kind == 'pyinstrument':
+            session = self.local.profiler.stop()
+            self.local.profiler = None
+            with self.lock:
+                self.sessions.append(session)
+        elif self.local.enabled:
+            self.local.profiler.disable()
+
+    def stats(self):
+        with self.lock:
+            profilers = list(self.profilers)
+        stats = None
+        for profiler in profilers:
+            profiler.create_stats()
+            if not profiler.stats:
+                continue
+            if stats is None:
+                stats = pstats.Stats(profiler, stream=io.StringIO())
+            else:
+                stats.add(profiler)
+        return stats
+
+    def session(self):
+        with self.lock:
+            sessions = list(self.sessions)
+        combined = None
+        for session in sessions:
+            combined = session if combined is None else Session.combine(combined, session)
+        return combined
+
+    def top_functions(self, count=TOP_FUNCTIONS):
+        # Hottest functions by own time, summed over threads (cProfile only)
+        stats = self.stats() if self.kind == 'cprofile' else None
+        if stats is None:
+            return []
+        rows = []
+        for (filename, line, name), (_, calls, tottime, cumtime, _) in stats.stats.items():
+            rows.append({'function': f"{filename}:{line}({name})", 'calls': calls,
+                         'own_seconds': round(tottime, 6), 'cumulative_seconds': round(cumtime, 6)})
+        rows.sort(key=lambda row: row['own_seconds'], reverse=True)
+        return rows[:count]
+
+    def dump(self, file_base):
+        # cProfile: a .prof for pstats / snakeviz; pyinstrument: an HTML call tree
+        if self.kind == 'cprofile':
+            stats = self.stats()
+            if stats is None:
+                return None
+            path = f"{file_base}.prof"
+            stats.dump_stats(path)
+            return path
+        session = self.session()
+        if session is None:
+            return None
+        path = f"{file_base}.html"
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(HTMLRenderer().render(session))
+        return path
+
+    def thread_count(self):
+        with self.lock:
+            return len(self.profilers) + len(self.sessions)
+
+
+def timing_report(tracker, pipeline, run=None, started_at=None, profile_file=None):
+    snap = tracker.snapshot()
+    stages = {}
+    for name, seconds in snap['phase_seconds'].items():
+        calls = snap['phase_calls'].get(name, 0)
+        stages[name] = {
+            'seconds': round(seconds, 6),
+            'calls': calls,
+            'mean_ms': round(seconds / calls * 1000, 3) if calls else None,
+        }
+    report = {
+        'version': REPORT_VERSION,
+        'pipeline': pipeline,
+        'started_at': started_at,
+        'wall_seconds': round(snap['elapsed'], 6),
+        'python': platform.python_version(),
+        'run': run or {},
+        'counters': {name: snap[name] for name in COUNTERS},
+        # Pages still failing after the client's retries (the first MAX_FAILED_LISTED)
+        'failed_fetches': snap['failed'],
+        # Stage times are summed over worker threads and may nest (image inside excel)
+        'stages': stages,
+    }
+    profiler = tracker.profiler
+    if profiler is not None:
+        report['profile'] = {
+            'profiler': profiler.kind,
+            'threads': profiler.thread_count(),
+            'file': profile_file,
+            'top_functions': profiler.top_functions(),
+        }
+    return report
+
+
+def report_json(report):
+    return json.dumps(report, indent=2, default=str)
+
+
+class Instrumentation:
+    # One instrumented run. The tracker is bound to the calling thread; code that
+    # fans out to worker threads binds it there with progress.bind(progress.current(), fn).
+    def __init__(self, pipeline, file_base, profiler=None, callback=None, run=None):
+        self.pipeline = pipeline
+        self.file_base = file_base
+        self.run = run
+        self.tracker = progress.ProgressTracker(callback=callback)
+        if profiler:
+            self.tracker.profiler = ThreadProfiler(profiler)
+        self.started_at = None
+        self.report_path = None
+
+    @contextmanager
+    def active(self):
+        self.started_at = datetime.now().isoformat(timespec='seconds')
+        with progress.bound(self.tracker):
+            yield self.tracker
+
+    def write_report(self):
+        # Writes <file_base>.json (and the profile next to it) in the output directory
+        profile_file = self.tracker.profiler.dump(self.file_base) if self.tracker.profiler is not None else None
+        report = timing_report(self.tracker, self.pipeline, self.run, self.started_at, profile_file)
+        self.report_path = f"{self.file_base}.json"
+        with open(self.report_path, 'w', encoding='utf-8') as f:
+            f.write(report_json(report))
+        print(f"Timing report written to {self.report_path}" + (f", profile to {profile_file}" if profile_file else ''))
+        return self.report_path
+
+
+def report_file_base(prefix='timing_report'):
+    return f"{prefix}_{time.strftime('%Y%m%d_%H%M%S')}"
@@ -0,0 +1,127 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Background jobs for the Streamlit frontend. A submit returns a job ID at once;
+# the pool's queue holds jobs beyond the concurrency cap until a slot frees up,
+# and finished results stay here so they can be downloaded later. A job writes its
+# files to a directory of its own; only what it returns (their paths) stays in memory.
+MAX_CONCURRENT_JOBS = int(os.environ.get('NREGA_MAX_JOBS', '2'))
+# Finished jobs (and their files) kept; the oldest are dropped first
+MAX_FINISHED_JOBS = 20
+MAX_JOB_MESSAGES = 200
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class Job:
+    def __init__(self, label, directory):
+        self.id = uuid.uuid4().hex[:8]
+        self.label = label
+        self.result_dir = os.path.join(directory, self.id)
+        self.status = QUEUED
+        self.messages = []
+        self.progress = None
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.lock = threading.Lock()
+
+    def add_message(self, msg):
+        with self.lock:
+            self.messages.append(msg)
+            if len(self.messages) > MAX_JOB_MESSAGES:
+                del self.messages[:len(self.messages) - MAX_JOB_MESSAGES]
+
+    def update(self, snapshot):
+        # progress_callback for the job: keeps the latest ProgressTracker snapshot
+        message = snapshot.get('message')
+        with self.lock:
+            new_message = message and (not self.messages or self.messages[-1] != message)
+            self.progress = snapshot
+        if new_message:
+            self.add_message(message)
+
+    def recent_messages(self, count=10):
+        with self.lock:
+            return self.messages[-count:]
+
+    @property
+    def finished(self):
+        return self.status in (DONE, FAILED)
+
+    @property
+    def elapsed(self):
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+
+class JobRunner:
+    def __init__(self, max_concurrent=MAX_CONCURRENT_JOBS, max_finished=MAX_FINISHED_JOBS):
+        self.executor = ThreadPoolExecutor(max_workers=max(1, max_concurrent), thread_name_prefix='nrega-job')
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_finished = max_finished
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+        self.directory = tempfile.mkdtemp(prefix='nrega_jobs_')
+
+    def submit(self, fn, *args, label='', **kwargs):
+        # fn gets the job's progress callback as progress_callback= and reports
+        # ProgressTracker snapshots through it; it writes its files to result_dir=
+        job = Job(label, self.directory)
+        with self.lock:
+            self.jobs[job.id] = job
+        self.executor.submit(self._run, job, fn, args, kwargs)
+        return job.id
+
+    def _run(self, job, fn, args, kwargs):
+        job.status = RUNNING
+        job.started_at = time.time()
+        try:
+            os.makedirs(job.result_dir)
+            job.result = fn(*args, progress_callback=job.update, result_dir=job.result_dir, **kwargs)
+            job.status = DONE
+        except Exception as e:
+            job.error = f"{e}"
+            job.add_message(traceback.format_exc())
+            job.status = FAILED
+        finally:
+            job.finished_at = time.time()
+            self._prune()
+
+    def _prune(self):
+        with self.lock:
+            finished = [job for job in self.jobs.values() if job.finished]
+            dropped = finished[:max(0, len(finished) - self.max_finished)]
+            for job in dropped:
+                del self.jobs[job.id]
+        for job in dropped:
+            shutil.rmtree(job.result_dir, ignore_errors=True)
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def active_count(self):
+        with self.lock:
+            return sum(1 for job in self.jobs.values() if job.status == RUNNING)
+
+    def queued_count(self):
+        with self.lock:
+            return sum(1 for job in self.jobs.values() if job.status == QUEUED)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        shutil.rmtree(self.directory, ignore_errors=True)
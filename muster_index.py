@@ -0,0 +1,100 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import date, datetime
+
+import http_cache
+
+# Remembers, per panchayat/work/date, which muster URL form returns data and which
+# muster numbers are known to be empty, so later runs skip those requests.
+INDEX_DIR = os.path.join(http_cache.CACHE_DIR, 'muster_index')
+FORM_WITH_WORKCODE = 'with_workcode'
+FORM_WITHOUT_WORKCODE = 'without_workcode'
+# A known-empty muster number is probed again after this long, in case the roll was
+# uploaded late
+EMPTY_TTL_SECONDS = 7 * 24 * 3600
+
+
+def is_past_date(attendance_date):
+    try:
+        return datetime.strptime(attendance_date, '%d/%m/%Y').date() < date.today()
+    except (TypeError, ValueError):
+        return False
+
+
+class MusterIndex:
+    def __init__(self, panchayat_code, work_code, attendance_date, persist=None, fresh=False):
+        # fresh ignores what earlier runs stored (it is overwritten on save)
+        key = f"{panchayat_code}|{work_code}|{attendance_date}"
+        self.path = os.path.join(INDEX_DIR, hashlib.sha256(key.encode('utf-8')).hexdigest() + '.json')
+        # Muster rolls for today can still be filled in, so only past dates remember empties
+        self.remember_empty = is_past_date(attendance_date)
+        self.persist = http_cache.CACHE_ENABLED if persist is None else persist
+        self.lock = threading.Lock()
+        self.url_form = None
+        # Known-empty muster number -> when it was found empty
+        self.empty = {}
+        self.skipped_empty = 0
+        self.requests_saved = 0
+        if self.persist and not fresh:
+            self.load()
+
+    def load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.url_form = data.get('url_form')
+        if self.remember_empty:
+            empty = data.get('empty', {})
+            if isinstance(empty, list):
+                # Indexes written before entries expired date from their file
+                found = os.path.getmtime(self.path)
+                empty = {msr_no: found for msr_no in empty}
+            now = time.time()
+            self.empty = {int(msr_no): found for msr_no, found in empty.items() if now - found <= EMPTY_TTL_SECONDS}
+
+    def save(self):
+        if not self.persist:
+            return
+        with self.lock:
+            data = {'url_form': self.url_form, 'empty': {str(msr_no): self.empty[msr_no] for msr_no in sorted(self.empty)}}
+        try:
+            os.makedirs(INDEX_DIR, exist_ok=True)
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Error saving muster index: {e}")
+
+    def is_known_empty(self, msr_no):
+        with self.lock:
+            if msr_no in self.empty:
+                self.skipped_empty += 1
+                # Without the index this roll costs both URL forms
+                self.requests_saved += 2
+                return True
+        return False
+
+    def record_form(self, url_form):
+        with self.lock:
+            if self.url_form is None:
+                self.url_form = url_form
+
+    def record_single_form_fetch(self):
+        with self.lock:
+            self.requests_saved += 1
+
+    def mark_empty(self, msr_no):
+        # Only for a roll the portal itself answered "no data" for, fetched from the network
+        if self.remember_empty:
+            with self.lock:
+                self.empty[msr_no] = time.time()
+
+    def summary(self):
+        return (f"Skipped {self.skipped_empty} known-empty muster rolls; "
+                f"saved {self.requests_saved} page requests")
@@ -0,0 +1,196 @@
+import re
+from collections import namedtuple
+from sys import intern
+
+from bs4 import BeautifulSoup
+from bs4.dammit import UnicodeDammit
+
+try:
+    import lxml.html as lxml_html
+except ImportError:
+    lxml_html = None
+
+from process_pool import start_process_pool
+
+PHOTO_LINK_TEXT = 'Click here for large image'
+WORK_NAME_LABEL_ID = 'ContentPlaceHolder1_lbl_dtl'
+WORKER_NAME_SPAN_ID = 'lbl_workerName_'
+# The portal's message on a muster roll page that has no attendance for the request
+NO_DATA_MESSAGE = re.compile(rb'No\s+(?:Records?|Data)\s+Found', re.IGNORECASE)
+
+# One attendance row of a muster roll page. A namedtuple has no per-row __dict__
+# (__slots__ = ()) and is still a sequence, so row[1] and list(row) keep working.
+AttendanceRecord = namedtuple('AttendanceRecord', ('s_no', 'job_card_no', 'worker_name', 'attendance_date', 'attendance'))
+
+
+def make_record(s_no, job_card_no, worker_name, attendance_date, attendance):
+    # Serial numbers, dates and Present/Absent repeat on every muster roll of a run;
+    # interning keeps one copy of each instead of one per row
+    return AttendanceRecord(intern(s_no), job_card_no, worker_name, intern(attendance_date), intern(attendance))
+
+
+def make_records(rows):
+    # Rebuilds records from plain sequences (journal JSON, results from a parse process)
+    return [make_record(*row) for row in rows] if rows is not None else None
+
+
+def _extract_row(cols, col_map, name_td, text_of):
+    return make_record(
+        text_of(cols[col_map.get('S.No', -1)]) if 'S.No' in col_map else '',
+        text_of(cols[col_map.get('Job Card No', -1)]) if 'Job Card No' in col_map else '',
+        name_td,
+        text_of(cols[col_map.get('Attendance Date', -1)]) if 'Attendance Date' in col_map else '',
+        text_of(cols[col_map.get('Present/Absent', -1)]) if 'Present/Absent' in col_map else ''
+    )
+
+
+def parse_muster_page_bs4(content):
+    soup = BeautifulSoup(content, 'html.parser')
+    # Extract work name
+    work_name = None
+    for b in soup.find_all('b'):
+        if b.text.strip().startswith('Work Name'):
+            next_text = b.next_sibling
+            if next_text:
+                work_name = str(next_text).strip(' :\u00a0-')
+            break
+    if not work_name:
+        work_name_elem = soup.find(id=WORK_NAME_LABEL_ID)
+        if work_name_elem:
+            work_name = work_name_elem.text.strip()
+    # Attendance Table
+    attendance_data = []
+    tables = soup.find_all('table')
+    if not tables:
+        print("No tables found on the page.")
+        return None, None, work_name, None
+    attendance_table = tables[-1]
+    rows = attendance_table.find_all('tr')
+    header_cells = tuple(intern(th.text.strip()) for th in rows[0].find_all(['th', 'td']))
+    col_map = {name: idx for idx, name in enumerate(header_cells)}
+    text_of = lambda el: el.get_text(strip=True)
+    for row in rows[1:]:
+        cols = row.find_all('td')
+        if cols and any(c.get_text(strip=True) for c in cols):
+            name_td = ''
+            for td in cols:
+                span = td.find('span', id=lambda x: x and WORKER_NAME_SPAN_ID in x)
+                if span:
+                    name_td = span.get_text(strip=True)
+                    break
+            attendance_data.append(_extract_row(cols, col_map, name_td, text_of))
+    photo_url = None
+    img_link = soup.find('a', text=PHOTO_LINK_TEXT)
+    if img_link and img_link.has_attr('href'):
+        photo_url = img_link['href']
+    return attendance_data, photo_url, work_name, header_cells
+
+
+def _lxml_stripped_text(el):
+    # Same result as BeautifulSoup's get_text(strip=True)
+    return ''.join(t.strip() for t in el.itertext())
+
+
+def _lxml_single_string(el):
+    # Mirrors BeautifulSoup's Tag.string: the lone text child, descending through lone child tags
+    if len(el) == 0:
+        return el.text
+    if len(el) == 1 and not el.text and not el[0].tail:
+        return _lxml_single_string(el[0])
+    return None
+
+
+def parse_muster_page_lxml(content):
+    markup = UnicodeDammit(content, is_html=True).unicode_markup
+    root = lxml_html.document_fromstring(markup)
+    # Extract work name
+    work_name = None
+    for b in root.iter('b'):
+        if b.text_content().strip().startswith('Work Name'):
+            next_text = b.tail
+            if not next_text:
+                following = b.getnext()
+                if following is not None:
+                    next_text = lxml_html.tostring(following, encoding='unicode', with_tail=False)
+            if next_text:
+                work_name = next_text.strip(' :\u00a0-')
+            break
+    if not work_name:
+        work_name_elems = root.xpath('//*[@id=$id]', id=WORK_NAME_LABEL_ID)
+        if work_name_elems:
+            work_name = work_name_elems[0].text_content().strip()
+    # Attendance Table
+    attendance_data = []
+    tables = root.xpath('//table')
+    if not tables:
+        print("No tables found on the page.")
+        return None, None, work_name, None
+    attendance_table = tables[-1]
+    rows = list(attendance_table.iter('tr'))
+    header_cells = tuple(intern(th.text_content().strip()) for th in rows[0].iter('th', 'td'))
+    col_map = {name: idx for idx, name in enumerate(header_cells)}
+    for row in rows[1:]:
+        cols = list(row.iter('td'))
+        if cols and any(_lxml_stripped_text(c) for c in cols):
+            name_td = ''
+            for td in cols:
+                spans = td.xpath('.//span[contains(@id, $id)]', id=WORKER_NAME_SPAN_ID)
+                if spans:
+                    name_td = _lxml_stripped_text(spans[0])
+                    break
+            attendance_data.append(_extract_row(cols, col_map, name_td, _lxml_stripped_text))
+    photo_url = None
+    for a in root.iter('a'):
+        if _lxml_single_string(a) == PHOTO_LINK_TEXT:
+            photo_url = a.get('href')
+            break
+    return attendance_data, photo_url, work_name, header_cells
+
+
+BACKENDS = {'html.parser': parse_muster_page_bs4}
+if lxml_html is not None:
+    BACKENDS['lxml'] = parse_muster_page_lxml
+# lxml is several times faster on large muster pages; fall back to the pure-Python parser without it
+DEFAULT_BACKEND = 'lxml' if 'lxml' in BACKENDS else 'html.parser'
+
+
+def is_no_data_page(content):
+    # Tells the portal's "No Record Found" answer apart from an error or maintenance page
+    return bool(NO_DATA_MESSAGE.search(content))
+
+
+def parse_muster_page(content, backend=None):
+    backend = backend or DEFAULT_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown or unavailable parser backend: {backend}")
+    return BACKENDS[backend](content)
+
+
+def parse_muster_page_compact(content, backend=None):
+    # Rows as plain tuples: what a parse worker process sends back is small to pickle
+    attendance_data, photo_url, work_name, header_cells = parse_muster_page(content, backend)
+    if attendance_data is not None:
+        attendance_data = [tuple(row) for row in attendance_data]
+    return attendance_data, photo_url, work_name, header_cells
+
+
+class PageParser:
+    # workers > 0 moves parsing into a process pool so it is no longer serialized by
+    # the GIL; called from the fetch threads, each thread just waits for its own page
+    def __init__(self, workers=0, backend=None):
+        self.backend = backend
+        self.pool = start_process_pool(workers) if workers else None
+
+    def __call__(self, content):
+        if self.pool is not None:
+            attendance_data, photo_url, work_name, header_cells = self.pool.submit(
+                parse_muster_page_compact, content, self.backend).result()
+            # Unpickled strings are fresh copies; intern them in this process
+            header_cells = tuple(intern(h) for h in header_cells) if header_cells is not None else None
+            return make_records(attendance_data), photo_url, work_name, header_cells
+        return parse_muster_page(content, self.backend)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
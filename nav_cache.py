@@ -0,0 +1,85 @@
+import json
+import os
+import re
+import threading
+import time
+
+import http_cache
+
+# Resolved attend_2way drill-down links (state, district and block pages, and the
+# block's panchayath list) per financial year and attendance date, plus the date
+# dropdown of the form page. The portal rebuilds these pages at most once a day,
+# so within the TTL a run goes straight to the muster roll tables.
+NAV_DIR = os.path.join(http_cache.CACHE_DIR, 'navigation')
+NAV_TTL_SECONDS = 6 * 3600
+# New attendance dates appear during the day; the dropdown is refreshed sooner
+DATES_TTL_SECONDS = 3600
+
+
+class NavCache:
+    def __init__(self, fin_year, block_name, directory=None, enabled=http_cache.CACHE_ENABLED,
+                 ttl_seconds=NAV_TTL_SECONDS, dates_ttl_seconds=DATES_TTL_SECONDS):
+        name = re.sub(r'[^A-Za-z0-9]+', '_', f"{fin_year}_{block_name}").strip('_')
+        directory = directory or NAV_DIR
+        self.path = os.path.join(directory, f"{name}.json")
+        self.enabled = enabled
+        self.ttl_seconds = ttl_seconds
+        self.dates_ttl_seconds = dates_ttl_seconds
+        self.lock = threading.Lock()
+        self.data = self.load() if enabled else {}
+
+    def load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def save(self):
+        if not self.enabled:
+            return
+        now = time.time()
+        with self.lock:
+            by_date = self.data.get('by_date', {})
+            self.data['by_date'] = {d: entry for d, entry in by_date.items() if now - entry['fetched_at'] <= self.ttl_seconds}
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(self.data, f)
+            os.replace(tmp, self.path)
+
+    def _fresh(self, entry, ttl):
+        return entry is not None and time.time() - entry['fetched_at'] <= ttl
+
+    def date_options(self):
+        with self.lock:
+            entry = self.data.get('dates')
+        return entry['options'] if self._fresh(entry, self.dates_ttl_seconds) else None
+
+    def record_date_options(self, options):
+        with self.lock:
+            self.data['dates'] = {'fetched_at': time.time(), 'options': list(options)}
+        self.save()
+
+    def get(self, attendance_date):
+        # (steps, panchayath links) resolved for this date, or None if missing or expired
+        with self.lock:
+            entry = self.data.get('by_date', {}).get(attendance_date)
+        if not self._fresh(entry, self.ttl_seconds):
+            return None
+        return dict(entry['steps']), dict(entry['panchayaths'])
+
+    def record(self, attendance_date, steps, panchayaths):
+        with self.lock:
+            self.data.setdefault('by_date', {})[attendance_date] = {
+                'fetched_at': time.time(), 'steps': dict(steps), 'panchayaths': dict(panchayaths),
+            }
+        self.save()
+
+    def forget(self, attendance_date):
+        # A cached link stopped working; the next lookup navigates from the top
+        with self.lock:
+            removed = self.data.get('by_date', {}).pop(attendance_date, None)
+        if removed is not None:
+            self.save()
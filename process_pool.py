@@ -0,0 +1,15 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# Parse and image worker processes. Forking a process whose fetch threads are
+# running can copy a lock held by another thread into the child, so workers come
+# from a forkserver (spawn where there is none) and the pool is started when it is
+# created, before any fetch thread submits to it.
+START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+
+def start_process_pool(workers):
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(START_METHOD))
+    # Workers are started by the first submit; make it here rather than in a fetch thread
+    pool.submit(int).result()
+    return pool
@@ -0,0 +1,227 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+
+# Structured progress for a download run. Worker threads bind the run's tracker
+# with bound(), and the HTTP client, the cache and the pipeline stages report
+# into whatever tracker is bound to the calling thread; with none bound every
+# hook is a no-op. Phases may nest: image (PIL work for embedding) runs inside excel.
+PHASES = ('navigation', 'fetch', 'parse', 'photo', 'image', 'excel', 'summary', 'save')
+# Callbacks fire at most this often (plus on messages and at the end), so the
+# cost of rendering progress does not grow with the number of muster rolls
+EMIT_INTERVAL_SECONDS = 0.5
+THROUGHPUT_WINDOW_SECONDS = 30
+# Pages that could not be fetched after the client's retries are named in the
+# snapshot (and the timing report) up to this many; the count is always kept
+MAX_FAILED_LISTED = 100
+
+_local = threading.local()
+
+
+def current():
+    return getattr(_local, 'tracker', None)
+
+
+@contextmanager
+def bound(tracker):
+    previous = current()
+    _local.tracker = tracker
+    profiler = getattr(tracker, 'profiler', None)
+    if profiler is not None:
+        profiler.enter()
+    try:
+        yield tracker
+    finally:
+        if profiler is not None:
+            profiler.exit()
+        _local.tracker = previous
+
+
+def bind(tracker, fn):
+    # Wraps fn so it runs with tracker bound, for executor.map / submit
+    if tracker is None:
+        return fn
+
+    def run(*args, **kwargs):
+        with bound(tracker):
+            return fn(*args, **kwargs)
+    return run
+
+
+class _PhaseTimer:
+    __slots__ = ('tracker', 'name', 'start')
+
+    def __init__(self, tracker, name):
+        self.tracker = tracker
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.tracker.add_phase_time(self.name, time.perf_counter() - self.start)
+
+
+_NO_PHASE = nullcontext()
+
+
+def phase(name):
+    # Untracked runs share one no-op context manager: no allocation, no clock reads
+    tracker = current()
+    if tracker is None:
+        return _NO_PHASE
+    return _PhaseTimer(tracker, name)
+
+
+def record_request(nbytes, retries=0):
+    tracker = current()
+    if tracker is not None:
+        tracker.add_request(nbytes, retries)
+
+
+def record_total(count):
+    # For runs that learn their size piece by piece (one panchayath at a time)
+    tracker = current()
+    if tracker is not None:
+        tracker.add_total(count)
+
+
+def record_completed(count=1):
+    tracker = current()
+    if tracker is not None:
+        tracker.advance(count)
+
+
+def record_cache_hit(nbytes):
+    tracker = current()
+    if tracker is not None:
+        tracker.add_cache_hit(nbytes)
+
+
+def record_fetch_error(what):
+    # what names the page that failed, e.g. "muster roll 12 (03/07/2025)"
+    tracker = current()
+    if tracker is not None:
+        tracker.add_fetch_error(what)
+
+
+class ProgressTracker:
+    def __init__(self, total=0, callback=None, emit_interval=EMIT_INTERVAL_SECONDS, window=THROUGHPUT_WINDOW_SECONDS):
+        self.callback = callback
+        self.emit_interval = emit_interval
+        self.window = window
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.last_emit = 0.0
+        self.total = total
+        self.completed = 0
+        self.requests = 0
+        self.bytes = 0
+        self.cache_hits = 0
+        self.cache_bytes = 0
+        self.retries = 0
+        self.fetch_errors = 0
+        self.failed = []
+        self.phase_seconds = dict.fromkeys(PHASES, 0.0)
+        self.phase_calls = dict.fromkeys(PHASES, 0)
+        # Set by instrumentation to profile every thread the tracker is bound to
+        self.profiler = None
+        self.message = None
+        self.samples = deque([(self.started, 0)])
+
+    def set_total(self, total):
+        with self.lock:
+            self.total = total
+        self.emit(force=True)
+
+    def add_total(self, count):
+        with self.lock:
+            self.total += count
+        self.emit()
+
+    def advance(self, count=1):
+        now = time.monotonic()
+        with self.lock:
+            self.completed += count
+            self.samples.append((now, self.completed))
+            while len(self.samples) > 2 and now - self.samples[0][0] > self.window:
+                self.samples.popleft()
+        self.emit()
+
+    def add_request(self, nbytes, retries=0):
+        with self.lock:
+            self.requests += 1
+            self.bytes += nbytes
+            self.retries += retries
+
+    def add_cache_hit(self, nbytes):
+        with self.lock:
+            self.cache_hits += 1
+            self.cache_bytes += nbytes
+
+    def add_fetch_error(self, what):
+        with self.lock:
+            self.fetch_errors += 1
+            if len(self.failed) < MAX_FAILED_LISTED:
+                self.failed.append(what)
+
+    def add_phase_time(self, name, seconds):
+        with self.lock:
+            self.phase_seconds[name] = self.phase_seconds.get(name, 0.0) + seconds
+            self.phase_calls[name] = self.phase_calls.get(name, 0) + 1
+
+    def log(self, message):
+        print(message)
+        with self.lock:
+            self.message = message
+        self.emit(force=True)
+
+    def snapshot(self):
+        now = time.monotonic()
+        with self.lock:
+            first_time, first_done = self.samples[0]
+            span = now - first_time
+            rate = (self.completed - first_done) / span if span > 0 else 0.0
+            remaining = max(0, self.total - self.completed)
+            return {
+                'completed': self.completed,
+                'total': self.total,
+                'requests': self.requests,
+                'bytes': self.bytes,
+                'cache_hits': self.cache_hits,
+                'cache_bytes': self.cache_bytes,
+                'retries': self.retries,
+                'fetch_errors': self.fetch_errors,
+                'failed': list(self.failed),
+                # Summed over worker threads, so these can add up to more than elapsed
+                'phase_seconds': dict(self.phase_seconds),
+                'phase_calls': dict(self.phase_calls),
+                'elapsed': now - self.started,
+                'rate': rate,
+                'eta': remaining / rate if rate > 0 else None,
+                'message': self.message,
+            }
+
+    def emit(self, force=False):
+        if self.callback is None:
+            return
+        now = time.monotonic()
+        with self.lock:
+            if not force and now - self.last_emit < self.emit_interval:
+                return
+            self.last_emit = now
+        self.callback(self.snapshot())
+
+    def finish(self, message=None):
+        if message:
+            self.log(message)
+        else:
+            self.emit(force=True)
+
+    def summary(self):
+        snap = self.snapshot()
+        phases = ', '.join(f"{name} {seconds:.1f}s" for name, seconds in snap['phase_seconds'].items() if seconds)
+        return (f"{snap['completed']}/{snap['total']} muster rolls in {snap['elapsed']:.1f}s; "
+                f"{snap['requests']} requests, {snap['bytes'] / 1048576:.1f} MB, {snap['cache_hits']} cache hits, "
+                f"{snap['retries']} retries, {snap['fetch_errors']} failed fetches; {phases}")
@@ -0,0 +1,155 @@
+import csv
+import io
+import os
+from datetime import datetime
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# Flat, one-row-per-worker-per-day attendance table shared by both downloaders.
+# Column kinds decide the Parquet type: low-cardinality columns are dictionary
+# encoded, dates become date32, everything else is a plain string.
+CATEGORY = 'category'
+STRING = 'string'
+DATE = 'date'
+
+ATTENDANCE_COLUMNS = [
+    ("Taluk", CATEGORY),
+    ("Panchayath", CATEGORY),
+    ("Work Code", CATEGORY),
+    ("Muster Roll No", CATEGORY),
+    ("Job Card No", STRING),
+    ("Worker Name", STRING),
+    ("Gender", CATEGORY),
+    ("Attendance", CATEGORY),
+    ("Attendance Date", DATE),
+]
+ATTENDANCE_HEADER = [name for name, _ in ATTENDANCE_COLUMNS]
+DATE_FORMAT = '%d/%m/%Y'
+# Rows buffered per Parquet row group
+PARQUET_BATCH_ROWS = 50000
+
+
+def split_worker_name(worker_name_full):
+    # Worker names come as "NAME (GENDER)"
+    if worker_name_full.endswith(')') and '(' in worker_name_full:
+        return worker_name_full[:worker_name_full.rfind('(')].strip(), worker_name_full[worker_name_full.rfind('(')+1:-1].strip()
+    return worker_name_full, ''
+
+
+def attendance_row(taluk, panchayath, work_code, muster_roll_no, att_row):
+    # att_row is one parsed muster row: S.No, Job Card No, Worker Name, Attendance Date, Present/Absent
+    name_part, gender_part = split_worker_name(att_row[2] if len(att_row) > 2 else '')
+    return [
+        taluk,
+        panchayath,
+        work_code,
+        muster_roll_no,
+        att_row[1] if len(att_row) > 1 else '',
+        name_part,
+        gender_part,
+        att_row[4] if len(att_row) > 4 else '',
+        att_row[3] if len(att_row) > 3 else '',
+    ]
+
+
+def parse_date(value):
+    # The portal may append the capture time ("03/07/2025 10:11 AM"); keep the day
+    try:
+        return datetime.strptime(value.split()[0], DATE_FORMAT).date()
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+class CsvTableWriter:
+    def __init__(self, target, columns=ATTENDANCE_COLUMNS, append=False):
+        # target is a file name or a binary file object such as BytesIO; append adds
+        # rows to an existing file and only writes the header to a new one
+        write_header = True
+        if isinstance(target, str):
+            write_header = not (append and os.path.exists(target) and os.path.getsize(target) > 0)
+            self.file = open(target, 'a' if append else 'w', encoding='utf-8', newline='')
+            self.owns_file = True
+        else:
+            self.file = io.TextIOWrapper(target, encoding='utf-8', newline='')
+            self.owns_file = False
+        self.writer = csv.writer(self.file)
+        if write_header:
+            self.writer.writerow([name for name, _ in columns])
+
+    def write_rows(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        if self.owns_file:
+            self.file.close()
+        else:
+            self.file.flush()
+            self.file.detach()
+
+
+class ParquetTableWriter:
+    def __init__(self, target, columns=ATTENDANCE_COLUMNS, batch_rows=PARQUET_BATCH_ROWS):
+        if pa is None:
+            raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+        self.columns = columns
+        self.batch_rows = batch_rows
+        self.schema = pa.schema([(name, self._arrow_type(kind)) for name, kind in columns])
+        self.writer = pq.ParquetWriter(target, self.schema)
+        self.pending = []
+
+    @staticmethod
+    def _arrow_type(kind):
+        if kind == CATEGORY:
+            return pa.dictionary(pa.int32(), pa.string())
+        if kind == DATE:
+            return pa.date32()
+        return pa.string()
+
+    def write_rows(self, rows):
+        for row in rows:
+            self.pending.append(row)
+            if len(self.pending) >= self.batch_rows:
+                self._flush()
+
+    def _flush(self):
+        if not self.pending:
+            return
+        arrays = []
+        for i, (_, kind) in enumerate(self.columns):
+            values = [row[i] for row in self.pending]
+            if kind == CATEGORY:
+                arrays.append(pa.array(values, pa.string()).dictionary_encode())
+            elif kind == DATE:
+                # A batch holds only a handful of distinct dates; parse each once
+                parsed = {value: parse_date(value) for value in set(values)}
+                arrays.append(pa.array([parsed[v] for v in values], pa.date32()))
+            else:
+                arrays.append(pa.array(values, pa.string()))
+        self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+        self.pending = []
+
+    def close(self):
+        self._flush()
+        self.writer.close()
+
+
+TABLE_WRITERS = {'csv': CsvTableWriter}
+if pa is not None:
+    TABLE_WRITERS['parquet'] = ParquetTableWriter
+TABLE_FORMATS = list(TABLE_WRITERS)
+
+
+def write_table(rows, target, table_format, columns=ATTENDANCE_COLUMNS):
+    # Streams rows (any iterable) to a file name or binary file object
+    if table_format not in TABLE_WRITERS:
+        raise ValueError(f"Unknown or unavailable table format: {table_format}")
+    writer = TABLE_WRITERS[table_format](target, columns)
+    try:
+        writer.write_rows(rows)
+    finally:
+        writer.close()